@@ -0,0 +1,275 @@
+import numpy as np
+from scipy import sparse
+
+from project.bitset_matrix import BITSET_DENSITY, BitMatrix
+
+
+class MatrixBackend:
+    """
+    Interface of an engine for Boolean matrix operations
+    """
+
+    name = None
+
+    def from_coo(self, rows, cols, shape: tuple):
+        """
+        Create a matrix from indices of nonzero values.
+
+        Parameters
+        ----------
+        rows : array_like
+            Row indices of nonzero values.
+        cols : array_like
+            Column indices of nonzero values.
+        shape : tuple
+            Shape of the matrix.
+        Returns
+        -------
+        matrix : any
+            Returns the matrix in the format of the backend.
+        """
+        raise NotImplementedError
+
+    def from_sparse(self, matrix):
+        """
+        Convert a scipy sparse matrix to the format of the backend.
+        """
+        rows, cols = matrix.nonzero()
+        return self.from_coo(rows, cols, matrix.shape)
+
+    def to_sparse(self, matrix):
+        """
+        Convert a matrix of the backend to a scipy csr matrix.
+        """
+        rows, cols = self.nonzero(matrix)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=matrix.shape,
+            dtype=bool,
+        )
+
+    def eye(self, size: int):
+        """
+        Create an identity matrix.
+        """
+        return self.from_coo(np.arange(size), np.arange(size), (size, size))
+
+    def matmul(self, first, second):
+        """
+        Boolean product of two matrices.
+        """
+        raise NotImplementedError
+
+    def kron(self, first, second):
+        """
+        Kronecker product of two matrices.
+        """
+        raise NotImplementedError
+
+    def add(self, first, second):
+        """
+        Elementwise or of two matrices.
+        """
+        raise NotImplementedError
+
+    def difference(self, first, second):
+        """
+        Values of the first matrix that are absent in the second one.
+        """
+        raise NotImplementedError
+
+    def nonzero(self, matrix):
+        """
+        Indices of nonzero values.
+        """
+        raise NotImplementedError
+
+    def nnz(self, matrix) -> int:
+        """
+        Number of nonzero values.
+        """
+        raise NotImplementedError
+
+    def convert(self, matrix, backend):
+        """
+        Convert a matrix of another backend to the format of this one.
+
+        Parameters
+        ----------
+        matrix : any
+            Matrix in the format of backend.
+        backend : MatrixBackend
+            Backend the matrix belongs to.
+        Returns
+        -------
+        matrix : any
+            Returns the matrix in the format of this backend.
+        """
+        if backend is self:
+            return matrix
+        return self.from_sparse(backend.to_sparse(matrix))
+
+
+class ScipyBackend(MatrixBackend):
+    """
+    Backend over scipy csr matrices
+    """
+
+    name = "scipy"
+
+    def from_coo(self, rows, cols, shape: tuple):
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=shape, dtype=bool
+        )
+
+    def from_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool)
+
+    def to_sparse(self, matrix):
+        return matrix
+
+    def matmul(self, first, second):
+        return first @ second
+
+    def kron(self, first, second):
+        return sparse.kron(first, second, format="csr")
+
+    def add(self, first, second):
+        return first + second
+
+    def difference(self, first, second):
+        return first > second
+
+    def nonzero(self, matrix):
+        return matrix.nonzero()
+
+    def nnz(self, matrix) -> int:
+        return matrix.nnz
+
+
+class DenseBackend(MatrixBackend):
+    """
+    Backend over dense NumPy Boolean arrays
+    """
+
+    name = "dense"
+
+    def from_coo(self, rows, cols, shape: tuple):
+        matrix = np.zeros(shape, dtype=bool)
+        matrix[rows, cols] = True
+        return matrix
+
+    def from_sparse(self, matrix):
+        return matrix.toarray().astype(bool)
+
+    def to_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool)
+
+    def matmul(self, first, second):
+        return (first.astype(np.float32) @ second.astype(np.float32)) > 0
+
+    def kron(self, first, second):
+        return np.kron(first, second).astype(bool)
+
+    def add(self, first, second):
+        return first | second
+
+    def difference(self, first, second):
+        return first & ~second
+
+    def nonzero(self, matrix):
+        return np.nonzero(matrix)
+
+    def nnz(self, matrix) -> int:
+        return int(np.count_nonzero(matrix))
+
+
+class BitsetBackend(MatrixBackend):
+    """
+    Backend over bit-packed BitMatrix
+    """
+
+    name = "bitset"
+
+    def from_coo(self, rows, cols, shape: tuple):
+        return BitMatrix.from_coo(rows, cols, shape)
+
+    def from_sparse(self, matrix):
+        return BitMatrix.from_sparse(matrix)
+
+    def to_sparse(self, matrix):
+        return matrix.to_sparse()
+
+    def matmul(self, first, second):
+        return first @ second
+
+    def kron(self, first, second):
+        return first.kron(second)
+
+    def add(self, first, second):
+        return first + second
+
+    def difference(self, first, second):
+        return first > second
+
+    def nonzero(self, matrix):
+        return matrix.nonzero()
+
+    def nnz(self, matrix) -> int:
+        return matrix.nnz
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in [ScipyBackend(), DenseBackend(), BitsetBackend()]
+}
+
+
+def register_backend(backend: MatrixBackend):
+    """Makes a backend selectable by its name.
+
+    Parameters
+    ----------
+    backend : MatrixBackend
+        Backend to register.
+    """
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(backend="scipy") -> MatrixBackend:
+    """Finds a backend by its name.
+
+    Parameters
+    ----------
+    backend : str | MatrixBackend
+        Name of a registered backend or the backend itself.
+    Returns
+    -------
+    backend : MatrixBackend
+        Returns the backend.
+    """
+    if isinstance(backend, MatrixBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown matrix backend: {backend}")
+    return BACKENDS[backend]
+
+
+def choose_backend(backend, density: float) -> MatrixBackend:
+    """Picks the backend for matrices of the given density.
+
+    Parameters
+    ----------
+    backend : str | MatrixBackend
+        Requested backend. "auto" stands for scipy until the density crosses
+        BITSET_DENSITY and for bitset after.
+    density : float
+        Share of nonzero values of the matrices.
+    Returns
+    -------
+    backend : MatrixBackend
+        Returns the backend to use.
+    """
+    if backend == "auto":
+        return get_backend("bitset" if density >= BITSET_DENSITY else "scipy")
+    return get_backend(backend)
@@ -0,0 +1,207 @@
+import numpy as np
+from scipy import sparse
+
+BITSET_DENSITY = 0.1
+WORD_SIZE = 64
+
+
+class BitMatrix:
+    """
+    A class representing a Boolean matrix with rows stored as packed uint64 bitsets
+    """
+
+    def __init__(self, words: np.ndarray, shape: tuple):
+        self.words = words
+        self.shape = shape
+
+    @classmethod
+    def zeros(cls, shape: tuple):
+        """
+        Create an empty matrix.
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the matrix.
+        Returns
+        -------
+        matrix : BitMatrix
+            Returns matrix without nonzero values.
+        """
+        words_amount = (shape[1] + WORD_SIZE - 1) // WORD_SIZE
+        return cls(np.zeros((shape[0], words_amount), dtype=np.uint64), shape)
+
+    @classmethod
+    def from_coo(cls, rows, cols, shape: tuple):
+        """
+        Create a matrix from indices of nonzero values.
+
+        Parameters
+        ----------
+        rows : array_like
+            Row indices of nonzero values.
+        cols : array_like
+            Column indices of nonzero values.
+        shape : tuple
+            Shape of the matrix.
+        Returns
+        -------
+        matrix : BitMatrix
+            Returns the packed matrix.
+        """
+        matrix = cls.zeros(shape)
+        cols = np.asarray(cols, dtype=np.uint64)
+        np.bitwise_or.at(
+            matrix.words,
+            (np.asarray(rows, dtype=np.int64), (cols // WORD_SIZE).astype(np.int64)),
+            np.left_shift(np.uint64(1), cols % np.uint64(WORD_SIZE)),
+        )
+        return matrix
+
+    @classmethod
+    def from_sparse(cls, matrix):
+        """
+        Create a matrix from a scipy sparse matrix.
+
+        Parameters
+        ----------
+        matrix : spmatrix
+            Sparse Boolean matrix.
+        Returns
+        -------
+        matrix : BitMatrix
+            Returns the packed matrix.
+        """
+        rows, cols = matrix.nonzero()
+        return cls.from_coo(rows, cols, matrix.shape)
+
+    @classmethod
+    def from_dense(cls, matrix: np.ndarray):
+        """
+        Create a matrix from a dense NumPy Boolean array.
+
+        Parameters
+        ----------
+        matrix : np.ndarray
+            Dense Boolean array.
+        Returns
+        -------
+        matrix : BitMatrix
+            Returns the packed matrix.
+        """
+        result = cls.zeros(matrix.shape)
+        packed = np.packbits(matrix.astype(bool), axis=1, bitorder="little")
+        result.words.view(np.uint8)[:, : packed.shape[1]] = packed
+        return result
+
+    def to_dense(self):
+        """
+        Unpack the matrix to a dense NumPy Boolean array.
+        """
+        bits = np.unpackbits(self._bytes(), axis=1, bitorder="little")
+        return bits[:, : self.shape[1]].astype(bool)
+
+    def to_sparse(self):
+        """
+        Unpack the matrix to a scipy csr matrix.
+        """
+        rows, cols = self.nonzero()
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=self.shape,
+            dtype=bool,
+        )
+
+    def nonzero(self):
+        """
+        Indices of nonzero values in row-major order.
+        """
+        rows, words = np.nonzero(self.words)
+        if len(rows) == 0:
+            return rows, rows.copy()
+        bits = np.unpackbits(
+            self.words[rows, words].astype("<u8").view(np.uint8).reshape(-1, 8),
+            axis=1,
+            bitorder="little",
+        )
+        word_index, bit = np.nonzero(bits)
+        return rows[word_index], words[word_index] * WORD_SIZE + bit
+
+    @property
+    def nnz(self):
+        """
+        Number of nonzero values.
+        """
+        if hasattr(np, "bitwise_count"):
+            return int(np.bitwise_count(self.words).sum())
+        return int(np.unpackbits(self._bytes()).sum())
+
+    def copy(self):
+        return BitMatrix(self.words.copy(), self.shape)
+
+    def kron(self, other):
+        """
+        Kronecker product of two matrices.
+
+        Parameters
+        ----------
+        other : BitMatrix
+        Returns
+        -------
+        product : BitMatrix
+            Returns the Kronecker product.
+        """
+        shape = (self.shape[0] * other.shape[0], self.shape[1] * other.shape[1])
+        if other.shape[1] % WORD_SIZE == 0:
+            self_bits = self.to_dense()
+            words = np.where(
+                self_bits[:, None, :, None], other.words[None, :, None, :], np.uint64(0)
+            )
+            return BitMatrix(words.reshape(shape[0], -1), shape)
+
+        self_rows, self_cols = self.nonzero()
+        other_rows, other_cols = other.nonzero()
+        rows = np.add.outer(self_rows * other.shape[0], other_rows).ravel()
+        cols = np.add.outer(self_cols * other.shape[1], other_cols).ravel()
+        return BitMatrix.from_coo(rows, cols, shape)
+
+    def __add__(self, other):
+        return BitMatrix(self.words | _as_bit_matrix(other).words, self.shape)
+
+    def __or__(self, other):
+        return self + other
+
+    def __gt__(self, other):
+        return BitMatrix(self.words & ~_as_bit_matrix(other).words, self.shape)
+
+    def __matmul__(self, other):
+        """
+        Boolean product of two matrices.
+        The columns of self are processed by bytes: every group of eight rows of
+        other is combined into a table of all 256 unions, and each row of the
+        result gathers the union selected by its byte.
+        """
+        other = _as_bit_matrix(other)
+        if self.shape[1] != other.shape[0]:
+            raise ValueError(f"Shapes {self.shape} and {other.shape} are not aligned")
+        result = np.zeros((self.shape[0], other.words.shape[1]), dtype=np.uint64)
+        table = np.zeros((256, other.words.shape[1]), dtype=np.uint64)
+        self_bytes = self._bytes()
+
+        for group in range((self.shape[1] + 7) // 8):
+            column = self_bytes[:, group]
+            rows = other.words[group * 8 : group * 8 + 8]
+            if not column.any() or not rows.any():
+                continue
+            for bit, row in enumerate(rows):
+                table[1 << bit : 2 << bit] = table[: 1 << bit] | row
+            result |= table[column]
+
+        return BitMatrix(result, (self.shape[0], other.shape[1]))
+
+    def _bytes(self):
+        return self.words.astype("<u8", copy=False).view(np.uint8)
+
+
+def _as_bit_matrix(matrix):
+    return matrix if isinstance(matrix, BitMatrix) else BitMatrix.from_sparse(matrix)
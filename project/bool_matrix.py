@@ -1,6 +1,70 @@
+import pickle
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
 from pyformlang.finite_automaton import *
 from scipy import sparse
-from scipy.sparse import block_diag, csr_matrix, vstack, csr_array, lil_array
+from scipy.sparse import block_diag, csr_matrix
+
+from project.backends import choose_backend, get_backend
+from project.parallel import WorkerPool
+
+
+SQUARING_DENSITY = 0.01
+
+
+class RangeIndex(Mapping):
+    """
+    A class representing the index of states that are their own indices
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, state):
+        if state not in self:
+            raise KeyError(state)
+        return int(state)
+
+    def __contains__(self, state):
+        return isinstance(state, (int, np.integer)) and 0 <= state < self.size
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self):
+        return self.size
+
+
+class LazyIndex(Mapping):
+    """
+    A class representing the index of states built on the first lookup
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self._index = None
+
+    def _get_index(self) -> dict:
+        if self._index is None:
+            states = self.states
+            if isinstance(states, np.ndarray):
+                states = states.tolist()
+            self._index = {state: index for index, state in enumerate(states)}
+        return self._index
+
+    def __getitem__(self, state):
+        return self._get_index()[state]
+
+    def __contains__(self, state):
+        return state in self._get_index()
+
+    def __iter__(self):
+        return iter(self._get_index())
+
+    def __len__(self):
+        return len(self.states)
 
 
 class BoolMatrix:
@@ -10,54 +74,208 @@ class BoolMatrix:
 
     def __init__(self, nfa: NondeterministicFiniteAutomaton = None):
         if nfa is not None:
-            self.states = nfa.states
-            self.start_states = nfa.start_states
-            self.final_states = nfa.final_states
+            self.states = list(nfa.states)
             self.states_amount = len(self.states)
             self.states_dict = dict(
-                [(state, index) for (index, state) in enumerate(nfa.states)]
+                [(state, index) for (index, state) in enumerate(self.states)]
             )
+            self.start_states = nfa.start_states
+            self.final_states = nfa.final_states
             self.bool_matrix = self.init_bool_matrix(nfa)
         else:
-            self.states = set()
-            self.start_states = set()
-            self.final_states = set()
+            self.states = []
             self.states_amount = 0
             self.states_dict = {}
+            self.start_states = set()
+            self.final_states = set()
             self.bool_matrix = {}
 
-    def init_bool_matrix(self, nfa: NondeterministicFiniteAutomaton):
+    @property
+    def start_states(self):
         """
-        Creation of Boolean matrices by nfa.
+        Start states, restored from start_mask when they are implicit.
+        """
+        if self._start_states is None:
+            self._start_states = self._states_from_mask(self.start_mask)
+        return self._start_states
+
+    @start_states.setter
+    def start_states(self, states: set):
+        self._start_states = set(states)
+        self.start_mask = self._mask_from_states(self._start_states)
+
+    @property
+    def final_states(self):
+        """
+        Final states, restored from final_mask when they are implicit.
+        """
+        if self._final_states is None:
+            self._final_states = self._states_from_mask(self.final_mask)
+        return self._final_states
+
+    @final_states.setter
+    def final_states(self, states: set):
+        self._final_states = set(states)
+        self.final_mask = self._mask_from_states(self._final_states)
+
+    def _mask_from_states(self, states: set):
+        return np.fromiter(
+            (state in states for state in self.states),
+            dtype=bool,
+            count=self.states_amount,
+        )
+
+    def _states_from_mask(self, mask):
+        return {self.states[index] for index in np.flatnonzero(mask)}
+
+    @classmethod
+    def from_edges(
+        cls,
+        src,
+        dst,
+        labels,
+        states: list = None,
+        start_states: set = None,
+        final_states: set = None,
+    ):
+        """
+        Creation of Boolean matrices directly from transitions.
 
         Parameters
         ----------
-        nfa: NondeterministicFiniteAutomaton
-        Nfa by which boolean matrices will be built.
+        src : array_like
+            Indices of the source states of the transitions.
+        dst : array_like
+            Indices of the destination states of the transitions.
+        labels : array_like
+            Labels of the transitions.
+        states : list
+            States in index order, defaults to the indices themselves.
+        start_states : set
+            Start states of the automaton.
+        final_states : set
+            Final states of the automaton.
+        Returns
+        -------
+        bool_matrix : BoolMatrix
+            Returns the Boolean decomposition of the transitions.
         """
-        bool_decompose = {}
-        shape = (self.states_amount, self.states_amount)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if states is None:
+            states = list(range(int(max(src.max(initial=-1), dst.max(initial=-1))) + 1))
 
-        for first_state, transition in nfa.to_dict().items():
-            for symbol, second_states in transition.items():
-                second_states = (
-                    {second_states}
-                    if not isinstance(second_states, set)
-                    else second_states
-                )
+        bool_matrix = cls()
+        bool_matrix.states = list(states)
+        bool_matrix.states_amount = len(bool_matrix.states)
+        bool_matrix.states_dict = {
+            state: index for index, state in enumerate(bool_matrix.states)
+        }
+        bool_matrix.start_states = set(start_states or ())
+        bool_matrix.final_states = set(final_states or ())
+        bool_matrix.bool_matrix = _build_bool_decompose(
+            src, dst, labels, bool_matrix.states_amount
+        )
+        return bool_matrix
 
-                for state in second_states:
-                    first_index, second_index = (
-                        self.states_dict[first_state],
-                        self.states_dict[state],
-                    )
+    @classmethod
+    def from_arrays(cls, src, dst, label_ids, labels, states_amount: int = None):
+        """
+        Creation of Boolean matrices from integer arrays of transitions.
+        States are the indices themselves, no Python object is created per
+        transition or state.
 
-                    if symbol not in bool_decompose:
-                        bool_decompose[symbol] = sparse.csr_matrix(shape, dtype=bool)
+        Parameters
+        ----------
+        src : array_like
+            Indices of the source states of the transitions.
+        dst : array_like
+            Indices of the destination states of the transitions.
+        label_ids : array_like
+            Index of the label of every transition.
+        labels : Sequence | Mapping
+            Label by its index.
+        states_amount : int
+            Number of states, one more than the largest index by default.
+        Returns
+        -------
+        bool_matrix : BoolMatrix
+            Returns the Boolean decomposition without start and final states.
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if states_amount is None:
+            states_amount = int(max(src.max(initial=-1), dst.max(initial=-1))) + 1
 
-                    bool_decompose[symbol][first_index, second_index] = True
+        bool_matrix = cls()
+        bool_matrix.states = range(states_amount)
+        bool_matrix.states_amount = states_amount
+        bool_matrix.states_dict = RangeIndex(states_amount)
+        bool_matrix._start_states = set()
+        bool_matrix._final_states = set()
+        bool_matrix.start_mask = np.zeros(states_amount, dtype=bool)
+        bool_matrix.final_mask = np.zeros(states_amount, dtype=bool)
+        bool_matrix.bool_matrix = _decompose_by_ids(
+            src, dst, label_ids, labels, states_amount
+        )
+        return bool_matrix
 
-        return bool_decompose
+    @classmethod
+    def from_graph(cls, graph, start_nodes: set = None, final_nodes: set = None):
+        """
+        Creation of Boolean matrices by graph without building an nfa.
+
+        Parameters
+        ----------
+        graph : MultiDiGraph
+            Graph from networkx with labeled edges.
+        start_nodes : set
+            Start nodes. If both start and final nodes are None, every node is
+            start and final, as in create_nfa.
+        final_nodes : set
+            Final nodes.
+        Returns
+        -------
+        bool_matrix : BoolMatrix
+            Returns the Boolean decomposition of the graph.
+        """
+        nodes = list(graph.nodes)
+        nodes_dict = {node: index for index, node in enumerate(nodes)}
+        edges = list(graph.edges(data="label"))
+        src = np.fromiter((nodes_dict[u] for u, _, _ in edges), np.int64, len(edges))
+        dst = np.fromiter((nodes_dict[v] for _, v, _ in edges), np.int64, len(edges))
+        labels = [label for _, _, label in edges]
+
+        if start_nodes is None and final_nodes is None:
+            start_nodes = final_nodes = nodes
+
+        return cls.from_edges(
+            src,
+            dst,
+            labels,
+            states=nodes,
+            start_states={node for node in start_nodes or () if node in nodes_dict},
+            final_states={node for node in final_nodes or () if node in nodes_dict},
+        )
+
+    def init_bool_matrix(self, nfa: NondeterministicFiniteAutomaton):
+        """
+        Creation of Boolean matrices by nfa.
+
+        Parameters
+        ----------
+        nfa: NondeterministicFiniteAutomaton
+        Nfa by which boolean matrices will be built.
+        """
+        transitions = [
+            (self.states_dict[first_state], self.states_dict[second_state], symbol)
+            for first_state, symbol, second_state in nfa
+        ]
+        if not transitions:
+            return {}
+
+        src, dst, labels = zip(*transitions)
+        return _build_bool_decompose(src, dst, labels, self.states_amount)
 
     def to_automaton(self):
         """
@@ -80,13 +298,109 @@ class BoolMatrix:
 
         return nfa
 
-    def intersect(self, other):
+    def save(self, path: Path):
+        """
+        Write the matrices to a directory in a binary format.
+        Every matrix is stored as raw csr arrays, so load can map them into
+        memory instead of reading them. Integer and string states are stored
+        as an array as well, a range of states is kept as it is.
+
+        Parameters
+        ----------
+        path : Path
+            Directory of the matrices, created if it does not exist.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        labels = list(self.bool_matrix.keys())
+
+        for index, label in enumerate(labels):
+            matrix = csr_matrix(self.bool_matrix[label], dtype=bool)
+            matrix.sum_duplicates()
+            for name in ["indptr", "indices", "data"]:
+                np.save(path / f"{index}.{name}.npy", getattr(matrix, name))
+        np.save(path / "start_mask.npy", self.start_mask)
+        np.save(path / "final_mask.npy", self.final_mask)
+
+        states = self.states
+        if not isinstance(states, range):
+            array = self.states_array()
+            if array.dtype == object and all(isinstance(s, str) for s in states):
+                array = array.astype(str)
+            if array.dtype != object:
+                np.save(path / "states.npy", array)
+                states = None
+
+        with open(path / "meta.pickle", "wb") as file:
+            pickle.dump(
+                {
+                    "labels": labels,
+                    "states": states,
+                    "start_states": self._start_states,
+                    "final_states": self._final_states,
+                },
+                file,
+            )
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True):
+        """
+        Read the matrices written by save.
+
+        Parameters
+        ----------
+        path : Path
+            Directory of the matrices.
+        mmap : bool
+            Whether to map the csr arrays into memory read-only instead of
+            reading them. The pages are loaded lazily and are shared by every
+            process mapping the same directory. The index of the states is
+            built on the first lookup.
+        Returns
+        -------
+        bool_matrix : BoolMatrix
+            Returns the stored Boolean decomposition.
+        """
+        path = Path(path)
+        mmap_mode = "r" if mmap else None
+        with open(path / "meta.pickle", "rb") as file:
+            meta = pickle.load(file)
+
+        bool_matrix = cls()
+        states = meta["states"]
+        if states is None:
+            states = np.load(path / "states.npy", mmap_mode=mmap_mode)
+        bool_matrix.states = states
+        bool_matrix.states_amount = len(states)
+        bool_matrix.states_dict = (
+            RangeIndex(len(states)) if isinstance(states, range) else LazyIndex(states)
+        )
+        bool_matrix._start_states = meta["start_states"]
+        bool_matrix._final_states = meta["final_states"]
+        bool_matrix.start_mask = np.load(path / "start_mask.npy")
+        bool_matrix.final_mask = np.load(path / "final_mask.npy")
+
+        shape = (bool_matrix.states_amount, bool_matrix.states_amount)
+        for index, label in enumerate(meta["labels"]):
+            indptr, indices, data = [
+                np.load(path / f"{index}.{name}.npy", mmap_mode=mmap_mode)
+                for name in ["indptr", "indices", "data"]
+            ]
+            bool_matrix.bool_matrix[label] = csr_matrix(
+                (data, indices, indptr), shape=shape, copy=False
+            )
+
+        return bool_matrix
+
+    def intersect(self, other, backend="auto"):
         """
         Intersects two matrices.
 
         Parameters
         ----------
         other : BoolMatrix
+        backend : str | MatrixBackend
+            Matrix backend computing the Kronecker products.
         Returns
         -------
         intersection : BoolMatrix
@@ -96,90 +410,83 @@ class BoolMatrix:
         intersection.states_amount = self.states_amount * other.states_amount
         symbols = set(self.bool_matrix.keys()) & set(other.bool_matrix.keys())
 
-        intersection.bool_matrix = {
-            symbol: sparse.kron(
-                self.bool_matrix[symbol], other.bool_matrix[symbol], format="csr"
-            )
-            for symbol in symbols
-        }
-
-        def intersect_states(first_state, second_state, first_index, second_index):
-            state = first_index * other.states_amount + second_index
-            return (
-                state,
-                state
-                if first_state in self.start_states
-                and second_state in other.start_states
-                else None,
-                state
-                if first_state in self.final_states
-                and second_state in other.final_states
-                else None,
+        for symbol in symbols:
+            first, second = self.bool_matrix[symbol], other.bool_matrix[symbol]
+            engine = choose_backend(backend, _density(first) * _density(second))
+            intersection.bool_matrix[symbol] = engine.to_sparse(
+                engine.kron(engine.from_sparse(first), engine.from_sparse(second))
             )
 
-        for first_state, first_index in self.states_dict.items():
-            for second_state, second_index in other.states_dict.items():
-                state_index, start_state, final_state = intersect_states(
-                    first_state, second_state, first_index, second_index
-                )
-
-                if state_index is not None:
-                    intersection.states_dict[state_index] = state_index
-                if start_state is not None:
-                    intersection.start_states.add(start_state)
-                if final_state is not None:
-                    intersection.final_states.add(final_state)
+        intersection.states = range(intersection.states_amount)
+        intersection._start_states = None
+        intersection._final_states = None
+        intersection.start_mask = np.kron(self.start_mask, other.start_mask)
+        intersection.final_mask = np.kron(self.final_mask, other.final_mask)
 
         return intersection
 
-    def transitive_closure(self):
+    def transitive_closure(
+        self, mode: str = "auto", return_iterations: bool = False, backend="auto"
+    ):
         """
         Constructs the transitive closure of an automaton.
 
+        Parameters
+        ----------
+        mode : str
+            "squaring" multiplies the whole closure by itself, "delta" multiplies
+            only the newly found entries by the adjacency matrix and "auto"
+            chooses by the density of the adjacency matrix and moves to
+            squaring on long paths.
+        return_iterations : bool
+            Whether to return the number of iterations as well.
+        backend : str | MatrixBackend
+            Matrix backend computing the closure.
         Returns
         -------
         adjacency_matrix : csr_matrix
             Returns transitive closure matrix
         """
         if len(self.bool_matrix) == 0:
-            return sparse.csr_matrix((0, 0), dtype=bool)
+            adjacency_matrix = sparse.csr_matrix((0, 0), dtype=bool)
+            return (adjacency_matrix, 0) if return_iterations else adjacency_matrix
         adjacency_matrix = sum(self.bool_matrix.values())
 
-        prev = adjacency_matrix.nnz
-        curr = 0
-
-        while prev != curr:
-            adjacency_matrix += adjacency_matrix @ adjacency_matrix
-            prev = curr
-            curr = adjacency_matrix.nnz
+        adjacency_matrix, iterations = _transitive_closure(
+            adjacency_matrix, mode, backend
+        )
 
-        return adjacency_matrix
+        return (adjacency_matrix, iterations) if return_iterations else adjacency_matrix
 
-    def _direct_sum(self, other):
+    def _direct_sum(self, other, engine=get_backend()):
         """
         Build a block-diagonal matrix from the provided matrices.
 
         Parameters
         ----------
         other : BoolMatrix
+        engine : MatrixBackend
+            Matrix backend of the result.
 
         Returns
         -------
-        matrix : Dict[any, csr_matrix]
+        matrix : Dict[any, any]
             Returns result of the operation
         """
         matrix = {}
         symbols = set(self.bool_matrix.keys()) & set(other.bool_matrix.keys())
 
         for symbol in symbols:
-            matrix[symbol] = block_diag(
-                (other.bool_matrix[symbol], self.bool_matrix[symbol]),
-                format="csr",
+            matrix[symbol] = engine.from_sparse(
+                block_diag(
+                    (other.bool_matrix[symbol], self.bool_matrix[symbol]),
+                    format="csr",
+                )
             )
 
         return matrix
 
-    def _make_front(self, other):
+    def _make_front(self, other, engine=get_backend()):
         """Create front matrix for bfs.
         For the specified set of starting vertices, find the set of reachable vertices.
 
@@ -187,55 +494,97 @@ class BoolMatrix:
         ----------
         other : BoolMatrix
             Regular expression represented as an adjacency matrix.
+        engine : MatrixBackend
+            Matrix backend of the front.
         Returns
         -------
-        front : Tuple[csr_matrix, List[any]]
+        front : any
             Returns front.
         """
-        front = sparse.lil_matrix(
-            (other.states_amount, self.states_amount + other.states_amount)
+        start_indexes = np.flatnonzero(self.start_mask)
+        return self._build_front(
+            other,
+            1,
+            np.zeros(len(start_indexes), dtype=np.int64),
+            start_indexes,
+            engine,
         )
 
-        self_start_row = sparse.lil_array(
-            [[state in self.start_states for state in self.states]]
-        )
+    def _make_separate_front(self, other, start_indexes=None, engine=get_backend()):
+        """Create front matrix for bfs.
+        For each vertex from the specified set find the set of reachable vertices.
 
-        for _, i in other.states_dict.items():
-            front[i, i] = True
-            front[i, other.states_amount :] = self_start_row
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        start_indexes : array_like
+            Indices of the start vertices, every start vertex by default.
+        engine : MatrixBackend
+            Matrix backend of the front.
+        Returns
+        -------
+        front : any
+            Returns front with one block of rows per start vertex.
+        """
+        if start_indexes is None:
+            start_indexes = np.flatnonzero(self.start_mask)
+        start_indexes = np.asarray(start_indexes, dtype=np.int64)
 
-        return front.tocsr()
+        return self._build_front(
+            other,
+            len(start_indexes),
+            np.arange(len(start_indexes)),
+            start_indexes,
+            engine,
+        )
 
-    def _make_separate_front(self, other):
-        """Create front matrix for bfs.
-        For each vertex from the specified set find the set of reachable vertices.
+    def _build_front(
+        self, other, blocks: int, seed_blocks, seed_indexes, engine=get_backend()
+    ):
+        """Create front matrix of several independent blocks.
 
         Parameters
         ----------
         other : BoolMatrix
             Regular expression represented as an adjacency matrix.
+        blocks : int
+            Number of blocks of the front.
+        seed_blocks : array_like
+            Block of every seed vertex.
+        seed_indexes : array_like
+            Indices of the seed vertices.
+        engine : MatrixBackend
+            Matrix backend of the front.
         Returns
         -------
-        front : Tuple[csr_matrix, List[any]]
+        front : any
             Returns front.
         """
-        start_indexes = {
-            index
-            for index, state in enumerate(self.states)
-            if state in self.start_states
-        }
+        k = other.states_amount
+        other_start_indexes = np.flatnonzero(other.start_mask)
 
-        fronts = [self._make_front(other) for _ in start_indexes]
+        diagonal = np.arange(blocks * k)
+        seed_rows = (
+            np.asarray(seed_blocks, dtype=np.int64)[:, None] * k
+            + other_start_indexes[None, :]
+        ).ravel()
+        seed_cols = k + np.repeat(seed_indexes, len(other_start_indexes))
+        rows = np.concatenate([diagonal, seed_rows])
+        cols = np.concatenate([diagonal % k if k else diagonal, seed_cols])
 
-        return (
-            csr_matrix(vstack(fronts))
-            if len(fronts) > 0
-            else csr_matrix(
-                (other.states_amount, other.states_amount + self.states_amount)
-            )
-        )
+        return engine.from_coo(rows, cols, (blocks * k, k + self.states_amount))
 
-    def constraint_bfs(self, other, is_separate: bool = False):
+    def constraint_bfs(
+        self,
+        other,
+        is_separate: bool = False,
+        batch_size: int = None,
+        backend="auto",
+        as_arrays: bool = False,
+        workers: int = None,
+        executor: str = "thread",
+    ):
         """Traverse presented graph via BFS with matrix operations and with constraint.
 
         Parameters
@@ -244,78 +593,750 @@ class BoolMatrix:
             Regular expression represented as an adjacency matrix.
         is_separate : bool
             Flag represented type of solving problem
+        batch_size : int
+            Number of start vertices traversed at once when is_separate is set,
+            all of them by default.
+        backend : str | MatrixBackend
+            Matrix backend of the traversal.
+        as_arrays : bool
+            Whether to return NumPy arrays of vertices instead of a set.
+        workers : int
+            Number of workers multiplying the front by the matrices of different
+            symbols concurrently. By default the products are sequential.
+        executor : str
+            Pool of the workers, "thread" or "process".
         Returns
         -------
         Reachable vertices.
         """
-        direct_sum = self._direct_sum(other)
-        n = self.states_amount
+        if is_separate:
+            batches = list(
+                self.constraint_bfs_batches(
+                    other, batch_size, backend, as_arrays, workers, executor
+                )
+            )
+            if as_arrays:
+                return tuple(
+                    np.concatenate(
+                        [batch[i] for batch in batches] or [self.states_array()[:0]]
+                    )
+                    for i in range(2)
+                )
+            return set().union(*batches)
+
+        engine = self._bfs_backend(other, backend)
+        direct_sum = self._direct_sum(other, engine)
+        is_visited = self._make_front(other, engine)
+
+        with WorkerPool(workers, executor) as pool:
+            while True:
+                old_nnz = engine.nnz(is_visited)
+                is_visited = _bfs_step(
+                    is_visited,
+                    direct_sum,
+                    other.states_amount,
+                    engine,
+                    pool if workers is not None else None,
+                )
+                if old_nnz == engine.nnz(is_visited):
+                    break
+
+        _, final_indexes = self._bfs_result(
+            is_visited, other, np.zeros(1, np.int64), engine
+        )
+        if as_arrays:
+            return self.states_array()[final_indexes]
+        return {self.states[j] for j in final_indexes.tolist()}
+
+    def constraint_bfs_batches(
+        self,
+        other,
+        batch_size: int = None,
+        backend="auto",
+        as_arrays: bool = False,
+        workers: int = None,
+        executor: str = "thread",
+    ):
+        """Traverse presented graph via BFS separately for every start vertex.
+        Start vertices are processed in batches and a vertex is dropped from the
+        front as soon as its part of the front stops growing.
+
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        batch_size : int
+            Number of start vertices traversed at once, all of them by default.
+        backend : str | MatrixBackend
+            Matrix backend of the traversal.
+        as_arrays : bool
+            Whether to yield NumPy arrays of start and reachable vertices instead
+            of sets of pairs.
+        workers : int
+            Number of workers multiplying the front by the matrices of different
+            symbols concurrently. By default the products are sequential.
+        executor : str
+            Pool of the workers, "thread" or "process".
+        Returns
+        -------
+        result : Iterator[set | Tuple[np.ndarray, np.ndarray]]
+            Yields pairs of start and reachable vertices for every batch.
+        """
+        engine = self._bfs_backend(other, backend)
+        direct_sum = self._direct_sum(other, engine)
         k = other.states_amount
-        symbols = set(self.bool_matrix.keys()) & set(other.bool_matrix.keys())
+        start_indexes = np.flatnonzero(self.start_mask)
+        batch_size = batch_size or max(len(start_indexes), 1)
+
+        with WorkerPool(workers, executor) as pool:
+            for begin in range(0, len(start_indexes), batch_size):
+                sources = start_indexes[begin : begin + batch_size]
+                is_visited = self._make_separate_front(other, sources, engine)
+                results = []
+
+                while is_visited.shape[0] > 0:
+                    old_nnz = _blocks_nnz(is_visited, k, engine)
+                    is_visited = _bfs_step(
+                        is_visited,
+                        direct_sum,
+                        k,
+                        engine,
+                        pool if workers is not None else None,
+                    )
+                    is_converged = old_nnz == _blocks_nnz(is_visited, k, engine)
+
+                    if is_converged.any():
+                        converged_rows = np.repeat(is_converged, k)
+                        results.append(
+                            self._bfs_result(
+                                _select_rows(is_visited, converged_rows, engine),
+                                other,
+                                sources[is_converged],
+                                engine,
+                            )
+                        )
+                        is_visited = _select_rows(is_visited, ~converged_rows, engine)
+                        sources = sources[~is_converged]
+
+                first, second = [
+                    np.concatenate([result[i] for result in results] or [sources[:0]])
+                    for i in range(2)
+                ]
+                if as_arrays:
+                    yield self.states_array()[first], self.states_array()[second]
+                else:
+                    yield {
+                        (self.states[i], self.states[j])
+                        for i, j in zip(first.tolist(), second.tolist())
+                    }
+
+    def frontier_search(self, other, batch_size: int = None, backend="auto"):
+        """Traverse the intersection with the other automaton without building it.
+        For every state of the other automaton the front keeps a matrix with a row
+        per start state and a column per state of this automaton, and it is
+        advanced by the matrices of this automaton along the transitions of the
+        other one.
+
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        batch_size : int
+            Number of start states traversed at once, all of them by default.
+        backend : str | MatrixBackend
+            Matrix backend of the traversal.
+        Returns
+        -------
+        result : Iterator[Tuple[np.ndarray, np.ndarray]]
+            Yields indices of start and final states connected by a nonempty
+            path, as they are found at every step. Every pair is yielded once.
+        """
+        engine = self._bfs_backend(other, backend)
+        matrices, transitions = self._frontier_operands(other, engine)
+        other_final_indexes = np.flatnonzero(other.final_mask).tolist()
+
+        start_indexes = np.flatnonzero(self.start_mask)
+        batch_size = batch_size or max(len(start_indexes), 1)
+        for begin in range(0, len(start_indexes), batch_size):
+            sources = start_indexes[begin : begin + batch_size]
+            delta = self._frontier_seeds(other.start_mask, sources, engine)
+            visited = {}
+            answered = None
+
+            while delta:
+                delta = _frontier_step(delta, visited, transitions, matrices, engine)
+
+                found = None
+                for q in other_final_indexes:
+                    if q in delta:
+                        found = (
+                            delta[q] if found is None else engine.add(found, delta[q])
+                        )
+                if found is None:
+                    continue
+                if answered is not None:
+                    found = engine.difference(found, answered)
+                answered = found if answered is None else engine.add(answered, found)
+
+                rows, cols = engine.nonzero(found)
+                is_final = self.final_mask[cols]
+                if is_final.any():
+                    yield sources[rows[is_final]], cols[is_final]
 
-        start_states_indices, final_states_indices, other_final_states_indices = [
-            [i for i, st in enumerate(states) if st in target_states]
-            for states, target_states in [
-                (self.states, self.start_states),
-                (self.states, self.final_states),
-                (other.states, other.final_states),
+    def bidirectional_search(self, other, reverse=None, backend="auto"):
+        """Traverse the intersection with the other automaton from both ends.
+        A forward front grows from the start states and a backward front from
+        the final states over the reversed automata, and at every step the
+        smaller of them is advanced. Once either of them is complete the pairs
+        are joined through the product states they share.
+
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        reverse : BoolMatrix
+            Reversed automaton, self.reverse() by default.
+        backend : str | MatrixBackend
+            Matrix backend of the traversal.
+        Returns
+        -------
+        result : Tuple[np.ndarray, np.ndarray]
+            Distinct pairs of indices of start and final states connected by
+            a nonempty path.
+        """
+        if reverse is None:
+            reverse = self.reverse()
+        other_reverse = other.reverse()
+        engine = self._bfs_backend(other, backend)
+        fronts = []
+        for bool_matrix, regex, seeds in [
+            (self, other, np.flatnonzero(self.start_mask)),
+            (reverse, other_reverse, np.flatnonzero(self.final_mask)),
+        ]:
+            matrices, transitions = bool_matrix._frontier_operands(regex, engine)
+            delta = bool_matrix._frontier_seeds(regex.start_mask, seeds, engine)
+            fronts.append([matrices, transitions, delta, {}, seeds])
+
+        # The backward front counts its seeds as visited and the forward one
+        # does not, so that every joined path has at least one edge.
+        fronts[1][3].update(fronts[1][2])
+        forward_steps = 0
+        while all(front[2] for front in fronts):
+            nnz = [
+                sum(engine.nnz(matrix) for matrix in front[2].values())
+                for front in fronts
             ]
-        ]
+            side = 0 if forward_steps == 0 or nnz[0] <= nnz[1] else 1
+            matrices, transitions, delta, visited, _ = fronts[side]
+            fronts[side][2] = _frontier_step(
+                delta, visited, transitions, matrices, engine
+            )
+            forward_steps += side == 0
+
+        forward, backward = fronts[0][3], fronts[1][3]
+        joined = None
+        for q in forward.keys() & backward.keys():
+            product = engine.matmul(
+                forward[q], engine.from_sparse(engine.to_sparse(backward[q]).T)
+            )
+            joined = product if joined is None else engine.add(joined, product)
+        if joined is None:
+            return unique_pairs(np.zeros(0, np.int64), np.zeros(0, np.int64))
+
+        rows, cols = engine.nonzero(joined)
+        return unique_pairs(fronts[0][4][rows], fronts[1][4][cols])
+
+    def reverse(self):
+        """
+        Automaton accepting the reversed words: the matrices are transposed and
+        start and final states are swapped.
+
+        Returns
+        -------
+        reverse : BoolMatrix
+            Returns the reversed automaton over the same states.
+        """
+        reverse = BoolMatrix()
+        reverse.states = self.states
+        reverse.states_amount = self.states_amount
+        reverse.states_dict = self.states_dict
+        reverse.bool_matrix = {
+            symbol: matrix.T.tocsr() for symbol, matrix in self.bool_matrix.items()
+        }
+        reverse._start_states = self._final_states
+        reverse._final_states = self._start_states
+        reverse.start_mask = self.final_mask
+        reverse.final_mask = self.start_mask
+        return reverse
+
+    def _frontier_operands(self, other, engine=get_backend()):
+        """Matrices of the common symbols and transitions of the other automaton.
+
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        engine : MatrixBackend
+            Matrix backend of the traversal.
+        Returns
+        -------
+        operands : Tuple[dict, dict]
+            Returns the matrices of this automaton by symbol and the targets of
+            the other automaton by symbol and source state.
+        """
+        symbols = set(self.bool_matrix.keys()) & set(other.bool_matrix.keys())
+        matrices = {
+            symbol: engine.from_sparse(self.bool_matrix[symbol]) for symbol in symbols
+        }
+        transitions = {}
+        for symbol in symbols:
+            for p, q in zip(*other.bool_matrix[symbol].nonzero()):
+                transitions.setdefault(symbol, {}).setdefault(int(p), []).append(int(q))
+        return matrices, transitions
+
+    def _frontier_seeds(self, other_start_mask, sources, engine=get_backend()):
+        """Front of the sources in every start state of the other automaton.
+
+        Parameters
+        ----------
+        other_start_mask : np.ndarray
+            Start states of the other automaton.
+        sources : np.ndarray
+            Indices of the source states of this automaton.
+        engine : MatrixBackend
+            Matrix backend of the traversal.
+        Returns
+        -------
+        front : Dict[int, any]
+            Returns a matrix with a row per source for every start state.
+        """
+        seeds = engine.from_coo(
+            np.arange(len(sources)), sources, (len(sources), self.states_amount)
+        )
+        return {int(q): seeds for q in np.flatnonzero(other_start_mask)}
+
+    def states_array(self):
+        """
+        States in index order as a NumPy array.
+        """
+        if isinstance(self.states, range):
+            return np.arange(self.states_amount, dtype=np.int64)
+        if isinstance(self.states, np.ndarray):
+            return self.states
+        states = np.empty(self.states_amount, dtype=object)
+        states[:] = self.states
+        if all(isinstance(state, (int, np.integer)) for state in self.states):
+            states = states.astype(np.int64)
+        return states
+
+    def _bfs_backend(self, other, backend):
+        """Picks the backend of the traversal by the density of the direct sum.
+
+        Parameters
+        ----------
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        backend : str | MatrixBackend
+            Requested matrix backend.
+        Returns
+        -------
+        backend : MatrixBackend
+            Returns the backend to use.
+        """
+        size = (self.states_amount + other.states_amount) ** 2
+        nnz = sum(matrix.nnz for matrix in self.bool_matrix.values()) + sum(
+            matrix.nnz for matrix in other.bool_matrix.values()
+        )
+        return choose_backend(backend, nnz / size if size > 0 else 0)
+
+    def _bfs_result(self, is_visited, other, sources, engine=get_backend()):
+        """Extract reachable final vertices from the visited front.
+
+        Parameters
+        ----------
+        is_visited : csr_matrix
+            Visited front with one block of rows per source.
+        other : BoolMatrix
+            Regular expression represented as an adjacency matrix.
+        sources : array_like
+            Index of the source of every block.
+        engine : MatrixBackend
+            Matrix backend of the front.
+        Returns
+        -------
+        result : Tuple[np.ndarray, np.ndarray]
+            Distinct pairs of indices of source and reachable final vertices.
+        """
+        k = other.states_amount
+        rows, cols = engine.nonzero(is_visited)
+        is_graph = cols >= k
+        rows, cols = rows[is_graph], cols[is_graph] - k
+
+        is_final = other.final_mask[rows % k] & self.final_mask[cols]
+        return unique_pairs(np.asarray(sources)[rows[is_final] // k], cols[is_final])
+
+
+def _bfs_step(is_visited, direct_sum, amount, engine=get_backend(), pool=None):
+    """Makes one step of the constrained bfs.
+
+    Parameters
+    ----------
+    is_visited : any
+        Visited front.
+    direct_sum : Dict[any, any]
+        Direct sum of regex and graph matrices.
+    amount : int
+        Number of state at the regex fa.
+    engine : MatrixBackend
+        Matrix backend of the front.
+    pool : WorkerPool
+        Workers computing the products of all symbols from the same front. By
+        default every product already sees the front extended by the previous
+        symbols.
+    Returns
+    -------
+    is_visited : any
+        Visited front extended by one step.
+    """
+    if pool is None:
+        for symbol in direct_sum:
+            is_visited = engine.add(
+                is_visited,
+                _symbol_front(is_visited, direct_sum[symbol], amount, engine),
+            )
+        return is_visited
 
-        is_visited = (
-            self._make_front(other)
-            if not is_separate
-            else self._make_separate_front(other)
+    matrices = [direct_sum[symbol] for symbol in sorted(direct_sum, key=str)]
+    fronts = pool.map(
+        _symbol_front,
+        [is_visited] * len(matrices),
+        matrices,
+        [amount] * len(matrices),
+        [engine] * len(matrices),
+    )
+    for front in fronts:
+        is_visited = engine.add(is_visited, front)
+
+    return is_visited
+
+
+def _frontier_step(delta, visited, transitions, matrices, engine=get_backend()):
+    """Advances the front of the implicit product by one step.
+
+    Parameters
+    ----------
+    delta : Dict[int, any]
+        Newly reached states by state of the regex.
+    visited : Dict[int, any]
+        Reached states by state of the regex, updated in place.
+    transitions : Dict[any, Dict[int, list]]
+        Targets of the regex by symbol and source state.
+    matrices : Dict[any, any]
+        Matrices of the graph by symbol.
+    engine : MatrixBackend
+        Matrix backend of the front.
+    Returns
+    -------
+    delta : Dict[int, any]
+        States reached for the first time at this step.
+    """
+    new = {}
+    for symbol, symbol_transitions in transitions.items():
+        for p, targets in symbol_transitions.items():
+            if p not in delta:
+                continue
+            product = engine.matmul(delta[p], matrices[symbol])
+            for q in targets:
+                new[q] = engine.add(new[q], product) if q in new else product
+
+    delta = {}
+    for q, matrix in new.items():
+        if q in visited:
+            matrix = engine.difference(matrix, visited[q])
+        if engine.nnz(matrix) == 0:
+            continue
+        delta[q] = matrix
+        visited[q] = engine.add(visited[q], matrix) if q in visited else matrix
+    return delta
+
+
+def _symbol_front(front, matrix, amount, engine=get_backend()):
+    """Moves the front along the transitions of one symbol.
+
+    Parameters
+    ----------
+    front : any
+        Visited front.
+    matrix : any
+        Direct sum of regex and graph matrices of the symbol.
+    amount : int
+        Number of state at the regex fa.
+    engine : MatrixBackend
+        Matrix backend of the front.
+    Returns
+    -------
+    front : any
+        Valid front reached by the symbol.
+    """
+    return _transform_front(engine.matmul(front, matrix), amount, engine)
+
+
+def _blocks_nnz(front, amount, engine=get_backend()):
+    """Counts nonzero values of every block of the front.
+
+    Parameters
+    ----------
+    front : any
+        Front with blocks of amount rows.
+    amount : int
+        Number of state at the regex fa.
+    engine : MatrixBackend
+        Matrix backend of the front.
+    Returns
+    -------
+    nnz : np.ndarray
+        Number of nonzero values of every block.
+    """
+    rows, _ = engine.nonzero(front)
+    return np.bincount(rows // amount, minlength=front.shape[0] // amount)
+
+
+def _select_rows(matrix, mask, engine=get_backend()):
+    """Keeps only the rows of the matrix selected by the mask.
+
+    Parameters
+    ----------
+    matrix : any
+        Matrix to select rows from.
+    mask : np.ndarray
+        Boolean mask of the rows to keep.
+    engine : MatrixBackend
+        Matrix backend of the matrix.
+    Returns
+    -------
+    matrix : any
+        Matrix of the selected rows.
+    """
+    rows, cols = engine.nonzero(matrix)
+    is_kept = mask[rows]
+    new_rows = np.cumsum(mask) - 1
+    return engine.from_coo(
+        new_rows[rows[is_kept]], cols[is_kept], (int(mask.sum()), matrix.shape[1])
+    )
+
+
+def unique_pairs(first, second):
+    """Removes repeated pairs of indices.
+
+    Parameters
+    ----------
+    first : np.ndarray
+        First indices of the pairs.
+    second : np.ndarray
+        Second indices of the pairs.
+    Returns
+    -------
+    pairs : Tuple[np.ndarray, np.ndarray]
+        Distinct pairs in lexicographic order.
+    """
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    if len(first) == 0:
+        return first, second
+    keys = np.unique(first * (int(second.max()) + 1) + second)
+    return divmod(keys, int(second.max()) + 1)
+
+
+def _density(matrix):
+    size = matrix.shape[0] * matrix.shape[1]
+    return matrix.nnz / size if size > 0 else 0
+
+
+def _transitive_closure(adjacency_matrix, mode: str = "auto", backend="auto"):
+    """Closure engine shared by every transitive closure.
+
+    Parameters
+    ----------
+    adjacency_matrix : csr_matrix
+        Square Boolean adjacency matrix.
+    mode : str
+        One of "squaring", "delta" or "auto". The "auto" mode starts with
+        delta on sparse matrices and moves to squaring once the number of
+        iterations exceeds log2 of the number of states, so long paths take
+        a logarithmic number of iterations.
+    backend : str | MatrixBackend
+        Matrix backend computing the closure. The "auto" backend moves to the
+        bitset backend once the closure gets dense.
+    Returns
+    -------
+    closure : Tuple[csr_matrix, int]
+        Transitive closure and the number of iterations it took.
+    """
+    adjacency_matrix = sparse.csr_matrix(adjacency_matrix, dtype=bool)
+    density = _density(adjacency_matrix)
+    if mode not in ("squaring", "delta", "auto"):
+        raise ValueError(f"Unknown transitive closure mode: {mode}")
+    is_auto = mode == "auto"
+    if is_auto:
+        mode = "squaring" if density >= SQUARING_DENSITY else "delta"
+    squaring_after = adjacency_matrix.shape[0].bit_length()
+
+    engine = choose_backend(backend, density)
+    closure = base = delta = engine.from_sparse(adjacency_matrix)
+    size = adjacency_matrix.shape[0] * adjacency_matrix.shape[1]
+    iterations = 0
+    while engine.nnz(delta) > 0:
+        new_engine = choose_backend(backend, engine.nnz(closure) / size)
+        if new_engine is not engine:
+            base, delta, closure = [
+                new_engine.convert(matrix, engine) for matrix in (base, delta, closure)
+            ]
+            engine = new_engine
+        iterations += 1
+        if is_auto and iterations > squaring_after:
+            mode = "squaring"
+        product = (
+            engine.matmul(closure, closure)
+            if mode == "squaring"
+            else engine.matmul(delta, base)
         )
+        delta = engine.difference(product, closure)
+        closure = engine.add(closure, delta)
 
-        while True:
-            old_is_visited = is_visited.copy()
+    return engine.to_sparse(closure), iterations
 
-            for symbol in symbols:
-                result = is_visited @ direct_sum[symbol]
-                transform = _transform_front(result, other.states_amount)
-                is_visited += transform
 
-            if old_is_visited.nnz == is_visited.nnz:
-                break
+def _closure_insert(closure, edges, engine=get_backend()):
+    """Extends a transitive closure by new edges of the adjacency matrix.
+    A closure C is extended by the edges E as C + (I + C) E (I + C) until
+    nothing changes.
 
-        result = set()
-        rows, cols = is_visited.nonzero()
-        for i, j in zip(rows, cols):
-            if j >= k and i % k in other_final_states_indices:
-                if j - k in final_states_indices:
-                    if not is_separate:
-                        result.add(j - k)
-                    else:
-                        result.add((start_states_indices[i // n], j - k))
+    Parameters
+    ----------
+    closure : any
+        Transitive closure of the adjacency matrix.
+    edges : any
+        New edges of the adjacency matrix.
+    engine : MatrixBackend
+        Backend of the matrices.
+    Returns
+    -------
+    closure : Tuple[any, any]
+        Returns the closure with the new edges and its entries that were
+        absent in the previous one.
+    """
+    added = engine.from_coo([], [], closure.shape)
+    while True:
+        paths = engine.add(edges, engine.matmul(closure, edges))
+        paths = engine.add(paths, engine.matmul(paths, closure))
+        delta = engine.difference(paths, closure)
+        if engine.nnz(delta) == 0:
+            return closure, added
+        closure = engine.add(closure, delta)
+        added = engine.add(added, delta)
+
+
+def _build_bool_decompose(src, dst, labels, states_amount: int):
+    """Groups transitions by label and builds every matrix in one call.
+
+    Parameters
+    ----------
+    src : array_like
+        Indices of the source states.
+    dst : array_like
+        Indices of the destination states.
+    labels : array_like
+        Labels of the transitions.
+    states_amount : int
+        Number of states of the automaton.
+    Returns
+    -------
+    bool_decompose : Dict[any, csr_matrix]
+        Boolean matrix for every label.
+    """
+    labels_index = {}
+    label_ids = np.fromiter(
+        (labels_index.setdefault(label, len(labels_index)) for label in labels),
+        dtype=np.int64,
+        count=len(src),
+    )
+    return _decompose_by_ids(
+        src, dst, label_ids, list(labels_index.keys()), states_amount
+    )
+
+
+def _decompose_by_ids(src, dst, label_ids, labels, states_amount: int):
+    """Builds a matrix for every label of transitions given by label indices.
+
+    Parameters
+    ----------
+    src : array_like
+        Indices of the source states.
+    dst : array_like
+        Indices of the destination states.
+    label_ids : array_like
+        Index of the label of every transition.
+    labels : Sequence | Mapping
+        Label by its index.
+    states_amount : int
+        Number of states of the automaton.
+    Returns
+    -------
+    bool_decompose : Dict[any, csr_matrix]
+        Boolean matrix for every label with transitions.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    label_ids = np.asarray(label_ids, dtype=np.int64)
+
+    order = np.argsort(label_ids, kind="stable")
+    present = np.unique(label_ids)
+    bounds = np.searchsorted(label_ids[order], np.append(present, present[-1:] + 1))
+    shape = (states_amount, states_amount)
+
+    bool_decompose = {}
+    for index, label_id in enumerate(present.tolist()):
+        edges = order[bounds[index] : bounds[index + 1]]
+        bool_decompose[labels[label_id]] = sparse.csr_matrix(
+            (np.ones(len(edges), dtype=bool), (src[edges], dst[edges])),
+            shape=shape,
+            dtype=bool,
+        )
 
-        return result
+    return bool_decompose
 
 
-def _transform_front(front, amount):
+def _transform_front(front, amount, engine=get_backend()):
     """Transforms the front into valid.
 
     Parameters
     ----------
-    front : csr_matrix
+    front : any
         Invalid front
     amount : int
         Number of state at the regex fa.
+    engine : MatrixBackend
+        Matrix backend of the front.
     Returns
     -------
-    Front : csr_matrix
+    Front : any
         Valid new front.
     """
-    new_front = lil_array(front.shape)
+    rows, cols = engine.nonzero(front)
+    is_regex = cols < amount
+    is_reached = np.bincount(rows[~is_regex], minlength=front.shape[0]) > 0
 
-    rows, cols = front.nonzero()
-    for i, j in zip(rows, cols):
-        if j < amount:
-            row = front.getrow(i).tolil()[[0], amount:]
+    regex_rows, regex_cols = rows[is_regex], cols[is_regex]
+    is_kept = is_reached[regex_rows]
+    regex_rows, regex_cols = regex_rows[is_kept], regex_cols[is_kept]
+    new_rows = regex_rows // amount * amount + regex_cols if amount else regex_rows
 
-            if row.nnz > 0:
-                shift_row = i // amount * amount
-                new_front[shift_row + j, j] = 1
-                new_front[[shift_row + j], amount:] += row
+    gather = engine.from_coo(new_rows, regex_rows, (front.shape[0], front.shape[0]))
+    graph_rows, graph_cols = engine.nonzero(engine.matmul(gather, front))
+    is_graph = graph_cols >= amount
 
-    return new_front.tocsr()
+    return engine.from_coo(
+        np.concatenate([new_rows, graph_rows[is_graph]]),
+        np.concatenate([regex_cols, graph_cols[is_graph]]),
+        front.shape,
+    )
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    A class representing a bounded mapping that evicts the least recently used entries
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Find the value of the key and mark it as recently used.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry.
+        default : any
+            Value returned when the key is absent.
+        Returns
+        -------
+        value : any
+            Returns the cached value or default.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        """
+        Store the value, evicting the least recently used entry when full.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry.
+        value : any
+            Value of the entry.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        Find the value of the key or create and store it.
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry.
+        factory : Callable
+            Function without arguments creating the value on a miss.
+        Returns
+        -------
+        value : any
+            Returns the cached or the created value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Drop the entry of the key, or every entry if the key is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Numbers of hits and misses, current size and capacity of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -1,65 +1,81 @@
-from networkx import MultiDiGraph
+import numpy as np
+from networkx import DiGraph, MultiDiGraph, condensation, topological_sort
 from pyformlang.cfg import CFG, Variable
-from scipy.sparse import dok_array, eye, lil_matrix
+from scipy import sparse
+from scipy.sparse import eye
 
-from project.bool_matrix import BoolMatrix
-from project.cfg import cfg_to_wcnf
-from project.ecfg import ECFG
-from project.fa_utils import create_nfa
-from project.rsm import RSM
+from project.backends import choose_backend, get_backend
+from project.bool_matrix import _closure_insert
+from project.compiled_grammar import compile_grammar
+from project.parallel import WorkerPool
+from project.prepared_graph import prepare_graph
 
 
 def hellings_closure(cfg: CFG, graph: MultiDiGraph):
     """Find transitive closure of the graph with constraints of cfg grammar.
+    Every triple is processed once from a worklist and joined only with the
+    triples of the matching nonterminals at its end nodes.
 
     Parameters:
     ----------
-    cfg: CFG
-        Context-free grammar.
-    graph: MultiDiGraph
+    cfg: CFG | CompiledGrammar
+        Context-free grammar or the grammar compiled by compile_grammar.
+    graph: MultiDiGraph | PreparedGraph | tuple
         A directed graph class.
     Returns:
     -------
-    result: set
-        Result is set of triples of the form (node, non-terminal, node)
+    result: list
+        Result is list of distinct triples of the form (node, non-terminal, node)
     """
-    cfg = cfg_to_wcnf(cfg)
-    term_prod = {prod for prod in cfg.productions if len(prod.body) == 1}
-    var_prod = {prod for prod in cfg.productions if len(prod.body) == 2}
-    eps_prod = {prod for prod in cfg.productions if len(prod.body) > 2}
-    result = []
-    for (v, j, label) in graph.edges(data="label"):
-        for prod in term_prod:
-            if label == prod.body[0].value:
-                result.append((prod.head, v, j))
+    graph = prepare_graph(graph)
+    cfg = compile_grammar(cfg).wcnf
+    term_prod, by_left, by_right = {}, {}, {}
+    eps_heads = set()
+    for prod in cfg.productions:
+        if len(prod.body) == 0:
+            eps_heads.add(prod.head)
+        elif len(prod.body) == 1:
+            term_prod.setdefault(prod.body[0].value, set()).add(prod.head)
+        else:
+            left, right = prod.body
+            by_left.setdefault(left, {}).setdefault(right, set()).add(prod.head)
+            by_right.setdefault(right, {}).setdefault(left, set()).add(prod.head)
+
+    result, seen, worklist = [], set(), []
+    outgoing, incoming = {}, {}
+
+    def add(triple):
+        if triple in seen:
+            return
+        seen.add(triple)
+        result.append(triple)
+        worklist.append(triple)
+        head, v, j = triple
+        outgoing.setdefault((v, head), []).append(j)
+        incoming.setdefault((j, head), []).append(v)
+
+    for label, heads in term_prod.items():
+        if label not in graph.matrices:
+            continue
+        rows, cols = graph.matrices[label].nonzero()
+        for v, j in zip(rows.tolist(), cols.tolist()):
+            for head in heads:
+                add((head, graph.nodes[v], graph.nodes[j]))
     for n in graph.nodes:
-        for prod in eps_prod:
-            result.append((prod.head, n, n))
-    m = result.copy()
-    while m:
-        i, v, j = m.pop()
-        for (i_r, v_r, j_r) in result:
-            if v == j_r:
-                for prod in var_prod:
-                    closure = (prod.head, v_r, j)
-                    if (
-                        prod.body[0] == i_r
-                        and prod.body[1] == i
-                        and closure not in result
-                    ):
-                        result.append(closure)
-                        m.append(closure)
-        for (i_r, v_r, j_r) in result:
-            if j == v_r:
-                for prod in var_prod:
-                    closure = (prod.head, v, j_r)
-                    if (
-                        prod.body[0] == i
-                        and prod.body[1] == i_r
-                        and closure not in result
-                    ):
-                        result.append(closure)
-                        m.append(closure)
+        for head in eps_heads:
+            add((head, n, n))
+
+    while worklist:
+        i, v, j = worklist.pop()
+        new = []
+        for right, heads in by_left.get(i, {}).items():
+            for k in outgoing.get((j, right), ()):
+                new.extend((head, v, k) for head in heads)
+        for left, heads in by_right.get(i, {}).items():
+            for u in incoming.get((v, left), ()):
+                new.extend((head, u, j) for head in heads)
+        for triple in new:
+            add(triple)
     return result
 
 
@@ -70,6 +86,9 @@ def cfpq(
     final_nodes: set = None,
     start_symbol: Variable = Variable("S"),
     alg_type: str = "hellings",
+    backend="auto",
+    workers: int = None,
+    executor: str = "thread",
 ):
     """
     It allows you to solve a reachability problem
@@ -78,158 +97,418 @@ def cfpq(
 
     Parameters:
     ----------
-    cfg: CFG
-        Context-free grammar.
-    graph: MultiDiGraph
-        A directed graph class.
-    start_nodes: set | None
-        This is set of start nodes of the graph
-    final_nodes: set | None
-        This is set of final nodes of the graph
+    cfg: CFG | CompiledGrammar
+        Context-free grammar or the grammar compiled by compile_grammar, which
+        is compiled and cached on the first query otherwise.
+    graph: MultiDiGraph | PreparedGraph | tuple
+        A directed graph class, a graph prepared for many queries or arrays
+        (src, dst, label_ids, labels) of its edges.
+    start_nodes: set | np.ndarray | None
+        This is set of start nodes of the graph, or their mask
+    final_nodes: set | np.ndarray | None
+        This is set of final nodes of the graph, or their mask
     start_symbol: Variable
         Start symbol of CFG
+    backend: str | MatrixBackend
+        Matrix backend of the Matrix and Tensor algorithms.
+    workers: int | None
+        Number of workers of the Matrix algorithm.
+    executor: str
+        Pool of the workers of the Matrix algorithm, "thread" or "process".
     Returns:
     -------
     result: set
         Result is a set of pairs of nodes
     """
-    if start_nodes is None:
-        start_nodes = graph.nodes
-    if final_nodes is None:
-        final_nodes = graph.nodes
+    graph = prepare_graph(graph)
+    cfg = compile_grammar(cfg)
+    triples = (
+        hellings_closure(cfg, graph)
+        if alg_type == "hellings"
+        else matrix(cfg, graph, backend, workers, executor)
+        if alg_type == "matrix"
+        else tensor(cfg, graph, backend)
+    )
+    if start_nodes is None and final_nodes is None:
+        return {(v, j) for i, v, j in triples if i == start_symbol}
 
+    everything = np.ones(graph.nodes_amount, dtype=bool)
+    start_mask = everything if start_nodes is None else graph.mask(start_nodes)
+    final_mask = everything if final_nodes is None else graph.mask(final_nodes)
     return {
         (v, j)
-        for i, v, j in (
-            hellings_closure(cfg, graph)
-            if alg_type == "hellings"
-            else matrix(cfg, graph)
-            if alg_type == "matrix"
-            else tensor(cfg, graph)
-        )
-        if i == start_symbol and v in start_nodes and j in final_nodes
+        for i, v, j in triples
+        if i == start_symbol
+        and start_mask[graph.nodes_dict[v]]
+        and final_mask[graph.nodes_dict[j]]
     }
 
 
-def matrix(cfg: CFG, graph: MultiDiGraph):
+def matrix(
+    cfg: CFG,
+    graph: MultiDiGraph,
+    backend="auto",
+    workers: int = None,
+    executor: str = "thread",
+    mode: str = "delta",
+    return_stats: bool = False,
+    schedule: str = "scc",
+):
     """Find transitive closure of the graph with constraints of cfg grammar.
 
     Parameters:
     ----------
-    graph : MultiDiGraph
-        Input graph from networkx.
-    cfg : CFG
-        Context-Free Grammar.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Input graph from networkx, a prepared graph or arrays
+        (src, dst, label_ids, labels) of its edges.
+    cfg : CFG | CompiledGrammar
+        Context-Free Grammar or the grammar compiled by compile_grammar.
+    backend : str | MatrixBackend
+        Matrix backend. The "auto" backend moves to the bitset backend once
+        the matrices get dense.
+    workers : int | None
+        Number of workers computing the products of different productions
+        concurrently. In the naive mode with workers every iteration
+        multiplies the matrices of the previous one, otherwise products are
+        computed one by one and see the updates of the preceding productions.
+    executor : str
+        Pool of the workers, "thread" or "process".
+    mode : str
+        One of "naive" or "delta". The naive mode multiplies the whole
+        matrices of every production on every iteration. The delta mode keeps
+        the entries found on the previous iteration and computes only the
+        products dA * B + A * dB of them, every iteration multiplies the
+        matrices of the previous one as with workers.
+    return_stats : bool
+        Whether to return the statistics of the iterations as well.
+    schedule : str
+        One of "global" or "scc". The global schedule iterates over all the
+        productions until nothing changes. The scc schedule splits the
+        nonterminals into strongly connected components of their dependency
+        graph and finishes the components one by one in topological order,
+        a component that is not recursive takes a single iteration.
     Returns:
     -------
-    res : Set
-        Constrained transitive closure of graph.
+    res : Set | Tuple[Set, List[dict]]
+        Constrained transitive closure of graph. With return_stats, also the
+        component, the number of products, of new entries and of all entries
+        on every iteration.
     """
-    cfg = cfg_to_wcnf(cfg)
+    if mode not in ("naive", "delta"):
+        raise ValueError(f"Unknown matrix mode: {mode}")
+    if schedule not in ("global", "scc"):
+        raise ValueError(f"Unknown matrix schedule: {schedule}")
+    cfg = compile_grammar(cfg).wcnf
     term_prod = {prod for prod in cfg.productions if len(prod.body) == 1}
     var_prod = {prod for prod in cfg.productions if len(prod.body) == 2}
-    eps_prod = {prod for prod in cfg.productions if len(prod.body) > 2}
+    eps_prod = {prod for prod in cfg.productions if len(prod.body) == 0}
 
-    size = len(graph.nodes)
-    adjs = {v: dok_array((size, size), dtype=bool) for v in cfg.variables}
-    nodes = {n: i for i, n in enumerate(graph.nodes)}
+    graph = prepare_graph(graph)
+    size = graph.nodes_amount
+    edges = {v: ([], []) for v in cfg.variables}
 
-    for (v, u, label) in graph.edges(data="label"):
-        for prod in term_prod:
-            if label == prod.body[0].value:
-                adjs[prod.head][nodes[v], nodes[u]] = True
+    for prod in term_prod:
+        if prod.body[0].value in graph.matrices:
+            rows, cols = graph.matrices[prod.body[0].value].nonzero()
+            edges[prod.head][0].append(rows)
+            edges[prod.head][1].append(cols)
 
-    for adj in adjs.values():
-        adj.tocsr()
-
-    diag = eye(len(nodes), dtype=bool, format="csr")
     for v in eps_prod:
-        adjs[v.head] += diag
+        edges[v.head][0].append(np.arange(size))
+        edges[v.head][1].append(np.arange(size))
+
+    empty = np.zeros(0, dtype=np.int64)
+    edges = {
+        v: (np.concatenate([empty] + rows), np.concatenate([empty] + cols))
+        for v, (rows, cols) in edges.items()
+    }
+    total_size = max(len(edges) * size * size, 1)
+    engine = choose_backend(
+        backend, sum(len(rows) for rows, _ in edges.values()) / total_size
+    )
+    adjs = {
+        v: engine.from_coo(rows, cols, (size, size))
+        for v, (rows, cols) in edges.items()
+    }
 
-    changing = True
-    while changing:
-        changing = False
-        for prod in var_prod:
-            nnz_old = adjs[prod.head].nnz
-            adjs[prod.head] += adjs[prod.body[0]] @ adjs[prod.body[1]]
-            changing |= adjs[prod.head].nnz != nnz_old
+    var_prod = sorted(var_prod, key=str)
+    components = (
+        [(var_prod, True)] if schedule == "global" else _grammar_components(var_prod)
+    )
+    stats = []
+    with WorkerPool(workers, executor) as pool:
+        for component, (prods, recursive) in enumerate(components):
+            deltas = None
+            changing = True
+            while changing:
+                changing = False
+                nnz_before = sum(engine.nnz(adj) for adj in adjs.values())
+                new_engine = choose_backend(backend, nnz_before / total_size)
+                if new_engine is not engine:
+                    adjs = {
+                        v: new_engine.convert(adj, engine) for v, adj in adjs.items()
+                    }
+                    if deltas is not None:
+                        deltas = {
+                            v: new_engine.convert(delta, engine)
+                            for v, delta in deltas.items()
+                        }
+                    engine = new_engine
+
+                if mode == "delta":
+                    heads, firsts, seconds = _delta_operands(
+                        prods, adjs, deltas, engine
+                    )
+                    products = pool.map(engine.matmul, firsts, seconds)
+                    found = {}
+                    for head, product in zip(heads, products):
+                        found[head] = (
+                            engine.add(found[head], product)
+                            if head in found
+                            else product
+                        )
+                    deltas = {}
+                    for head, product in found.items():
+                        delta = engine.difference(product, adjs[head])
+                        if engine.nnz(delta) > 0:
+                            deltas[head] = delta
+                            adjs[head] = engine.add(adjs[head], delta)
+                    changing = len(deltas) > 0
+                    products_amount = len(heads)
+                elif workers is None:
+                    for prod in prods:
+                        nnz_old = engine.nnz(adjs[prod.head])
+                        adjs[prod.head] = engine.add(
+                            adjs[prod.head],
+                            engine.matmul(adjs[prod.body[0]], adjs[prod.body[1]]),
+                        )
+                        changing |= engine.nnz(adjs[prod.head]) != nnz_old
+                    products_amount = len(prods)
+                else:
+                    products = pool.map(
+                        engine.matmul,
+                        [adjs[prod.body[0]] for prod in prods],
+                        [adjs[prod.body[1]] for prod in prods],
+                    )
+                    for prod, product in zip(prods, products):
+                        nnz_old = engine.nnz(adjs[prod.head])
+                        adjs[prod.head] = engine.add(adjs[prod.head], product)
+                        changing |= engine.nnz(adjs[prod.head]) != nnz_old
+                    products_amount = len(prods)
+                changing &= recursive
+
+                nnz_after = sum(engine.nnz(adj) for adj in adjs.values())
+                stats.append(
+                    {
+                        "iteration": len(stats) + 1,
+                        "component": component,
+                        "products": products_amount,
+                        "new": nnz_after - nnz_before,
+                        "nnz": nnz_after,
+                    }
+                )
 
-    nodes = {i: n for n, i in nodes.items()}
     r = []
     for N, adj in adjs.items():
-        nz = adj.nonzero()
+        nz = engine.nonzero(adj)
         for i, j in list(zip(nz[0], nz[1])):
-            r.append((N, nodes[i], nodes[j]))
+            r.append((N, graph.nodes[i], graph.nodes[j]))
+    if return_stats:
+        return r, stats
     return r
 
 
-def tensor(cfg: CFG, graph: MultiDiGraph):
+def _grammar_components(var_prod):
+    """Groups productions by the strongly connected components of the
+    nonterminal dependency graph, where every head depends on its body.
+
+    Parameters
+    ----------
+    var_prod : List[Production]
+        Productions with two nonterminals in the body.
+    Returns
+    -------
+    components : List[Tuple[List[Production], bool]]
+        Returns the productions of every component whose head is in it, in
+        topological order of the components, and whether the component is
+        recursive.
+    """
+    dependencies = DiGraph()
+    for prod in var_prod:
+        dependencies.add_node(prod.head)
+        for body in prod.body:
+            dependencies.add_edge(body, prod.head)
+    condensed = condensation(dependencies)
+    mapping = condensed.graph["mapping"]
+
+    prods = {}
+    for prod in var_prod:
+        prods.setdefault(mapping[prod.head], []).append(prod)
+    return [
+        (
+            prods[component],
+            len(condensed.nodes[component]["members"]) > 1
+            or any(
+                mapping[body] == component
+                for prod in prods[component]
+                for body in prod.body
+            ),
+        )
+        for component in topological_sort(condensed)
+        if component in prods
+    ]
+
+
+def _delta_operands(var_prod, adjs, deltas, engine):
+    """Operands of the products of the entries found on the last iteration.
+
+    Parameters
+    ----------
+    var_prod : List[Production]
+        Productions with two nonterminals in the body.
+    adjs : dict
+        Matrix of every nonterminal.
+    deltas : dict | None
+        Matrix of the entries found on the last iteration by nonterminal,
+        nonterminals without new entries are absent. None on the first
+        iteration, when the whole products A * B are computed.
+    engine : MatrixBackend
+        Backend of the matrices.
+    Returns
+    -------
+    operands : Tuple[list, list, list]
+        Returns the heads of the productions and the left and right operands
+        of the products dA * B and A * dB that are not empty.
+    """
+    heads, firsts, seconds = [], [], []
+    for prod in var_prod:
+        left, right = prod.body
+        if deltas is None:
+            heads.append(prod.head)
+            firsts.append(adjs[left])
+            seconds.append(adjs[right])
+            continue
+        if left in deltas and engine.nnz(adjs[right]) > 0:
+            heads.append(prod.head)
+            firsts.append(deltas[left])
+            seconds.append(adjs[right])
+        if right in deltas and engine.nnz(adjs[left]) > 0:
+            heads.append(prod.head)
+            firsts.append(adjs[left])
+            seconds.append(deltas[right])
+    return heads, firsts, seconds
+
+
+def tensor(cfg: CFG, graph: MultiDiGraph, backend="auto"):
     """
-    Solves the reachability problem via the tensor algorithm
+    Solves the reachability problem via the tensor algorithm.
+    The Kronecker product of the RSM and the graph and its closure are built
+    once and then extended only by the products of the new nonterminal edges.
 
     Parameters:
     ----------
-    cfg : CFG
-        Context-Free Grammar.
-    graph : MultiDiGraph
-        Input graph from networkx.
+    cfg : CFG | CompiledGrammar
+        Context-Free Grammar or the grammar compiled by compile_grammar.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Input graph from networkx, a prepared graph or arrays
+        (src, dst, label_ids, labels) of its edges.
+    backend : str | MatrixBackend
+        Matrix backend of the intersection and closure. The "auto" backend
+        moves to the bitset backend once the closure gets dense.
     Returns:
     -------
     res : Set
         Constrained transitive closure of graph.
     """
-    bmatrix_rsm = BoolMatrix(
-        RSM.ecfg_to_rsm(ECFG.ecfg_from_cfg(cfg)).minimize().merge_boxes_to_nfa()
-    )
-    bm_rsm_i_st = {i: st for st, i in bmatrix_rsm.states_dict.items()}
-
-    bmatrix_graph = BoolMatrix(create_nfa(graph))
-    bm_g_i_st = {i: st for st, i in bmatrix_graph.states_dict.items()}
+    grammar = compile_grammar(cfg)
+    bmatrix_rsm = grammar.rsm
+    bmatrix_graph = prepare_graph(graph).query()
+    size = bmatrix_graph.states_amount
 
-    identity_matrix = eye(bmatrix_graph.states_amount, format="dok", dtype=bool)
-    for nonterm in cfg.get_nullable_symbols():
+    identity_matrix = eye(size, format="csr", dtype=bool)
+    for nonterm in grammar.nullable_symbols:
         if nonterm.value in bmatrix_graph.bool_matrix.keys():
-            bmatrix_graph.bool_matrix[nonterm.value] += identity_matrix
+            bmatrix_graph.bool_matrix[nonterm.value] = (
+                bmatrix_graph.bool_matrix[nonterm.value] + identity_matrix
+            )
         else:
             bmatrix_graph.bool_matrix[nonterm.value] = identity_matrix
 
-    index_len = 0
+    nonterms = {}
+    boxes = np.array(
+        [
+            nonterms.setdefault(state.value[0], len(nonterms))
+            for state in bmatrix_rsm.states
+        ],
+        dtype=np.int64,
+    )
+    nonterms = list(nonterms)
+
+    product_size = bmatrix_rsm.states_amount * size
+    closure = bmatrix_rsm.intersect(bmatrix_graph, backend).transitive_closure(
+        backend=backend
+    )
+    if closure.shape != (product_size, product_size):
+        closure = sparse.csr_matrix((product_size, product_size), dtype=bool)
+    rows, cols = closure.nonzero()
+
+    engine = get_backend()
+    nonterm_edges = {
+        nonterm: bmatrix_graph.bool_matrix[nonterm]
+        for nonterm in nonterms
+        if nonterm in bmatrix_graph.bool_matrix
+    }
+    rsm_matrices = {}
     while True:
-        tc_indexes = list(
-            zip(*bmatrix_rsm.intersect(bmatrix_graph).transitive_closure().nonzero())
+        new_engine = choose_backend(
+            backend, engine.nnz(closure) / max(product_size * product_size, 1)
         )
-        if len(tc_indexes) == index_len:
+        if new_engine is not engine:
+            closure = new_engine.convert(closure, engine)
+            nonterm_edges = {
+                nonterm: new_engine.convert(edges, engine)
+                for nonterm, edges in nonterm_edges.items()
+            }
+            rsm_matrices = {}
+            engine = new_engine
+
+        r_i, g_i = np.divmod(rows, size)
+        r_j, g_j = np.divmod(cols, size)
+        mask = bmatrix_rsm.start_mask[r_i] & bmatrix_rsm.final_mask[r_j]
+
+        new_edges = {}
+        for box in np.unique(boxes[r_i[mask]]).tolist():
+            in_box = mask & (boxes[r_i] == box)
+            nonterm = nonterms[box]
+            edges = engine.from_coo(g_i[in_box], g_j[in_box], (size, size))
+            if nonterm in nonterm_edges:
+                edges = engine.difference(edges, nonterm_edges[nonterm])
+            if engine.nnz(edges) > 0:
+                new_edges[nonterm] = edges
+        if len(new_edges) == 0:
             break
-        index_len = len(tc_indexes)
-
-        for (i, j) in tc_indexes:
-            r_i, g_i = divmod(i, bmatrix_graph.states_amount)
-            r_j, g_j = divmod(j, bmatrix_graph.states_amount)
-
-            state_from = bm_rsm_i_st[r_i]
-            state_to = bm_rsm_i_st[r_j]
-            nonterm, _ = state_from.value
-            if (
-                state_from in bmatrix_rsm.start_states
-                and state_to in bmatrix_rsm.final_states
-            ):
-                if nonterm.value in bmatrix_graph.bool_matrix.keys():
-                    bmatrix_graph.bool_matrix[nonterm][g_i, g_j] = True
-                else:
-                    bmatrix_graph.bool_matrix[nonterm] = lil_matrix(
-                        (
-                            bmatrix_graph.states_amount,
-                            bmatrix_graph.states_amount,
-                        ),
-                        dtype=bool,
+
+        product = engine.from_coo([], [], (product_size, product_size))
+        for nonterm, edges in new_edges.items():
+            nonterm_edges[nonterm] = (
+                engine.add(nonterm_edges[nonterm], edges)
+                if nonterm in nonterm_edges
+                else edges
+            )
+            if nonterm in bmatrix_rsm.bool_matrix:
+                if nonterm not in rsm_matrices:
+                    rsm_matrices[nonterm] = engine.from_sparse(
+                        bmatrix_rsm.bool_matrix[nonterm]
                     )
-                    bmatrix_graph.bool_matrix[nonterm][g_i, g_j] = True
+                product = engine.add(product, engine.kron(rsm_matrices[nonterm], edges))
+        closure, added = _closure_insert(closure, product, engine)
+        rows, cols = engine.nonzero(added)
+
+    for nonterm, edges in nonterm_edges.items():
+        bmatrix_graph.bool_matrix[nonterm] = engine.to_sparse(edges)
+    nodes = bmatrix_graph.states
     return {
-        (
-            nonterm,
-            bm_g_i_st[graph_i],
-            bm_g_i_st[graph_j],
-        )
+        (nonterm, nodes[graph_i], nodes[graph_j])
         for nonterm, mtx in bmatrix_graph.bool_matrix.items()
         for graph_i, graph_j in zip(*mtx.nonzero())
     }
@@ -0,0 +1,118 @@
+import hashlib
+import pickle
+from pathlib import Path
+
+from pyformlang.cfg import CFG
+
+from project.bool_matrix import BoolMatrix
+from project.cache import LRUCache
+from project.cfg import cfg_to_wcnf
+from project.ecfg import ECFG
+from project.rsm import RSM
+
+GRAMMAR_CACHE = LRUCache(maxsize=64)
+
+
+class CompiledGrammar:
+    """
+    A class representing a grammar converted once into the forms used by the
+    Hellings, Matrix and Tensor algorithms
+    """
+
+    def __init__(self, cfg: CFG, key: str = None):
+        """
+        Parameters
+        ----------
+        cfg : CFG
+            Context-free grammar.
+        key : str
+            Hash of the grammar, see grammar_key. Computed when None.
+        """
+        self.key = grammar_key(cfg) if key is None else key
+        self.cfg = cfg
+        self.wcnf = cfg_to_wcnf(cfg)
+        self.nullable_symbols = set(cfg.get_nullable_symbols())
+        self.rsm = BoolMatrix(
+            RSM.ecfg_to_rsm(ECFG.ecfg_from_cfg(cfg)).minimize().merge_boxes_to_nfa()
+        )
+
+    def save(self, path: Path):
+        """
+        Write the compiled grammar with pickle.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, "wb") as file:
+            pickle.dump(self, file)
+        temporary.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Read a compiled grammar written by save.
+        """
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+
+def grammar_key(cfg) -> str:
+    """Canonical hash of a grammar.
+
+    Parameters
+    ----------
+    cfg : CFG | str
+        Context-free grammar or its text.
+    Returns
+    -------
+    key : str
+        Returns the sha256 of the start symbol and the sorted productions, so
+        the order of productions and the formatting of the text do not
+        change it.
+    """
+    if isinstance(cfg, str):
+        cfg = CFG.from_text(cfg)
+    text = "\n".join(
+        [str(cfg.start_symbol)] + sorted(str(prod) for prod in cfg.productions)
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def compile_grammar(
+    cfg, cache: LRUCache = GRAMMAR_CACHE, path: Path = None
+) -> CompiledGrammar:
+    """Compiles a grammar unless it is compiled already.
+
+    Parameters
+    ----------
+    cfg : CFG | CompiledGrammar | str
+        Context-free grammar, its text or a compiled grammar.
+    cache : LRUCache
+        Cache of the compiled grammars by grammar_key, None to always compile.
+    path : Path
+        Directory of the compiled grammars stored on disk as <key>.pickle.
+        A missing grammar is compiled and written there.
+    Returns
+    -------
+    grammar : CompiledGrammar
+        Returns the compiled grammar. It is shared by every query of the same
+        grammar and must not be modified.
+    """
+    if isinstance(cfg, CompiledGrammar):
+        return cfg
+    if isinstance(cfg, str):
+        cfg = CFG.from_text(cfg)
+    key = grammar_key(cfg)
+
+    def build():
+        file = None if path is None else Path(path) / f"{key}.pickle"
+        if file is not None and file.exists():
+            return CompiledGrammar.load(file)
+        grammar = CompiledGrammar(cfg, key)
+        if file is not None:
+            grammar.save(file)
+        return grammar
+
+    if cache is None:
+        return build()
+    return cache.get_or_create(key, build)
@@ -0,0 +1,146 @@
+import numpy as np
+from pyformlang.regular_expression import Regex
+from pyformlang.regular_expression.regex_objects import (
+    Concatenation,
+    Empty,
+    Epsilon,
+    KleeneStar,
+    Symbol,
+    Union,
+)
+
+from project.bool_matrix import BoolMatrix
+
+
+def glushkov_matrix(regex) -> BoolMatrix:
+    """Builds Boolean matrices of the position (Glushkov) automaton of a regex.
+    State 0 is the start state and every other state is an occurrence of a
+    symbol in the expression, so the automaton has no epsilon transitions and
+    needs neither determinization nor minimization.
+
+    Parameters
+    ----------
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    Returns
+    -------
+    bool_matrix : BoolMatrix
+        Returns the decomposition of the nondeterministic automaton.
+    """
+    if isinstance(regex, str):
+        regex = Regex(regex)
+    symbols, nullable, first, last, follow_src, follow_dst = _positions(regex)
+
+    src = np.concatenate([np.zeros(len(first), dtype=np.int64), follow_src])
+    dst = np.concatenate([first, follow_dst])
+    final_states = set(last.tolist()) | ({0} if nullable else set())
+    return BoolMatrix.from_edges(
+        src,
+        dst,
+        [symbols[position - 1] for position in dst.tolist()],
+        states=list(range(len(symbols) + 1)),
+        start_states={0},
+        final_states=final_states,
+    )
+
+
+def positions_amount(regex) -> int:
+    """Number of occurrences of symbols in a regular expression.
+
+    Parameters
+    ----------
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    Returns
+    -------
+    amount : int
+        Returns the number of states of the Glushkov automaton minus one.
+    """
+    if isinstance(regex, str):
+        regex = Regex(regex)
+    amount, stack = 0, [regex]
+    while stack:
+        node = stack.pop()
+        amount += _is_position(node)
+        stack.extend(node.sons)
+    return amount
+
+
+def _positions(regex: Regex):
+    """Computes the sets of the Glushkov construction in one post-order pass.
+
+    Parameters
+    ----------
+    regex : Regex
+        Regular expression from pyformlang.
+    Returns
+    -------
+    sets : tuple
+        Returns the symbols of the positions numbered from one, whether the
+        empty word is accepted, the first and last positions, and the sources
+        and destinations of the follow pairs.
+    """
+    symbols, follow_src, follow_dst = [], [], []
+    values, stack = [], [(regex, False)]
+    empty = np.zeros(0, dtype=np.int64)
+
+    while stack:
+        node, is_done = stack.pop()
+        if not is_done:
+            stack.append((node, True))
+            stack.extend((son, False) for son in reversed(node.sons))
+            continue
+
+        head = node.head
+        if isinstance(head, Epsilon):
+            values.append((True, empty, empty))
+        elif isinstance(head, Empty):
+            values.append((False, empty, empty))
+        elif _is_position(node):
+            symbols.append(head.value)
+            position = np.array([len(symbols)], dtype=np.int64)
+            values.append((False, position, position))
+        elif isinstance(head, KleeneStar):
+            _, first, last = values.pop()
+            _add_follow(follow_src, follow_dst, last, first)
+            values.append((True, first, last))
+        elif isinstance(head, Union):
+            right, left = values.pop(), values.pop()
+            values.append(
+                (
+                    left[0] or right[0],
+                    np.concatenate([left[1], right[1]]),
+                    np.concatenate([left[2], right[2]]),
+                )
+            )
+        elif isinstance(head, Concatenation):
+            right, left = values.pop(), values.pop()
+            _add_follow(follow_src, follow_dst, left[2], right[1])
+            values.append(
+                (
+                    left[0] and right[0],
+                    np.concatenate([left[1], right[1]]) if left[0] else left[1],
+                    np.concatenate([left[2], right[2]]) if right[0] else right[2],
+                )
+            )
+        else:
+            raise ValueError(f"Unknown regex node: {head}")
+
+    nullable, first, last = values.pop()
+    return (
+        symbols,
+        nullable,
+        first,
+        last,
+        np.concatenate([empty] + follow_src),
+        np.concatenate([empty] + follow_dst),
+    )
+
+
+def _is_position(node) -> bool:
+    return isinstance(node.head, Symbol) and not isinstance(node.head, (Epsilon, Empty))
+
+
+def _add_follow(follow_src, follow_dst, last, first):
+    follow_src.append(np.repeat(last, len(first)))
+    follow_dst.append(np.tile(first, len(last)))
@@ -0,0 +1,51 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+class WorkerPool:
+    """
+    A class running independent tasks of an iteration in a pool of workers
+    """
+
+    def __init__(self, workers: int = None, executor: str = "thread"):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}")
+        self.workers = workers
+        self.executor = (
+            EXECUTORS[executor](max_workers=workers)
+            if workers is not None and workers > 1
+            else None
+        )
+
+    def map(self, function, *iterables) -> list:
+        """
+        Apply the function to every group of arguments.
+
+        Parameters
+        ----------
+        function : Callable
+            Function to apply. It must be picklable for the process executor.
+        iterables : Iterable
+            Arguments of the function.
+        Returns
+        -------
+        result : list
+            Results in the order of the arguments.
+        """
+        if self.executor is None:
+            return list(map(function, *iterables))
+        return list(self.executor.map(function, *iterables))
+
+    def close(self):
+        """
+        Shut the workers down.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
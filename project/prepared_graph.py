@@ -0,0 +1,195 @@
+from pathlib import Path
+
+import numpy as np
+from networkx import MultiDiGraph
+
+from project.bool_matrix import BoolMatrix
+
+
+class PreparedGraph:
+    """
+    A class representing a graph decomposed into Boolean matrices once and
+    queried with different start and final nodes
+    """
+
+    def __init__(self, bool_matrix: BoolMatrix):
+        self.nodes = bool_matrix.states
+        self.nodes_amount = bool_matrix.states_amount
+        self.nodes_dict = bool_matrix.states_dict
+        self.matrices = bool_matrix.bool_matrix
+        self.path = None
+        self._reverse_matrices = None
+
+    @classmethod
+    def from_graph(cls, graph: MultiDiGraph):
+        """
+        Decompose a graph by the labels of its edges.
+
+        Parameters
+        ----------
+        graph : MultiDiGraph
+            Graph from networkx with labeled edges.
+        Returns
+        -------
+        prepared_graph : PreparedGraph
+            Returns the prepared graph.
+        """
+        return cls(BoolMatrix.from_graph(graph, set(), set()))
+
+    @classmethod
+    def from_arrays(cls, src, dst, label_ids, labels, nodes_amount: int = None):
+        """
+        Decompose a graph given by integer arrays of its edges, see
+        BoolMatrix.from_arrays. Nodes are the indices themselves.
+
+        Parameters
+        ----------
+        src : array_like
+            Source node of every edge.
+        dst : array_like
+            Destination node of every edge.
+        label_ids : array_like
+            Index of the label of every edge.
+        labels : Sequence | Mapping
+            Label by its index.
+        nodes_amount : int
+            Number of nodes, one more than the largest index by default.
+        Returns
+        -------
+        prepared_graph : PreparedGraph
+            Returns the prepared graph.
+        """
+        return cls(BoolMatrix.from_arrays(src, dst, label_ids, labels, nodes_amount))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True):
+        """
+        Read a graph written by save, see BoolMatrix.load. A graph mapped
+        into memory is pickled as its path, so worker processes map the same
+        files instead of receiving a copy of the matrices.
+        """
+        prepared_graph = cls(BoolMatrix.load(path, mmap))
+        if mmap:
+            prepared_graph.path = Path(path)
+        return prepared_graph
+
+    def __reduce_ex__(self, protocol):
+        if self.path is not None:
+            return type(self).load, (self.path, True)
+        return super().__reduce_ex__(protocol)
+
+    def save(self, path: Path):
+        """
+        Write the matrices of the graph, see BoolMatrix.save.
+        """
+        self.query(set(), set()).save(path)
+
+    def mask(self, nodes) -> np.ndarray:
+        """
+        Boolean mask of nodes by their indices.
+
+        Parameters
+        ----------
+        nodes : Iterable | np.ndarray
+            Nodes of the graph, or a Boolean mask already. Nodes absent in the
+            graph are ignored.
+        Returns
+        -------
+        mask : np.ndarray
+            Returns the mask of the nodes.
+        """
+        if isinstance(nodes, np.ndarray) and nodes.dtype == bool:
+            if nodes.shape != (self.nodes_amount,):
+                raise ValueError(
+                    f"Mask of shape {nodes.shape} for {self.nodes_amount} nodes"
+                )
+            return nodes
+        mask = np.zeros(self.nodes_amount, dtype=bool)
+        mask[
+            [self.nodes_dict[node] for node in nodes if node in self.nodes_dict]
+        ] = True
+        return mask
+
+    def select(self, nodes) -> set:
+        """
+        Set of nodes given either as nodes or as a mask.
+        """
+        return {self.nodes[index] for index in np.flatnonzero(self.mask(nodes))}
+
+    def labeled_edges(self):
+        """
+        Edges of the graph as triples of source, destination and label.
+        """
+        for label, matrix in self.matrices.items():
+            rows, cols = matrix.nonzero()
+            for i, j in zip(rows.tolist(), cols.tolist()):
+                yield self.nodes[i], self.nodes[j], label
+
+    def query(
+        self, start_nodes=None, final_nodes=None, reverse: bool = False
+    ) -> BoolMatrix:
+        """
+        Boolean matrices of the graph with the given start and final nodes.
+        The matrices are shared with the prepared graph, only the dictionary
+        of them is copied.
+
+        Parameters
+        ----------
+        start_nodes : Iterable | np.ndarray
+            Start nodes or their mask. If both start and final nodes are None,
+            every node is start and final, as in create_nfa.
+        final_nodes : Iterable | np.ndarray
+            Final nodes or their mask.
+        reverse : bool
+            Whether to return the reversed graph, see BoolMatrix.reverse. The
+            transposed matrices are built on the first such query and kept.
+        Returns
+        -------
+        bool_matrix : BoolMatrix
+            Returns the decomposition of the graph.
+        """
+        if start_nodes is None and final_nodes is None:
+            start_mask = final_mask = np.ones(self.nodes_amount, dtype=bool)
+        else:
+            start_mask = self.mask(() if start_nodes is None else start_nodes)
+            final_mask = self.mask(() if final_nodes is None else final_nodes)
+
+        matrices = self.matrices
+        if reverse:
+            if self._reverse_matrices is None:
+                self._reverse_matrices = {
+                    label: matrix.T.tocsr() for label, matrix in self.matrices.items()
+                }
+            matrices = self._reverse_matrices
+            start_mask, final_mask = final_mask, start_mask
+
+        bool_matrix = BoolMatrix()
+        bool_matrix.states = self.nodes
+        bool_matrix.states_amount = self.nodes_amount
+        bool_matrix.states_dict = self.nodes_dict
+        bool_matrix.bool_matrix = dict(matrices)
+        bool_matrix._start_states = None
+        bool_matrix._final_states = None
+        bool_matrix.start_mask = start_mask
+        bool_matrix.final_mask = final_mask
+        return bool_matrix
+
+
+def prepare_graph(graph) -> PreparedGraph:
+    """Prepares a graph unless it is prepared already.
+
+    Parameters
+    ----------
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Graph from networkx, a prepared graph or a tuple of arrays src, dst,
+        label_ids and of labels, see PreparedGraph.from_arrays.
+    Returns
+    -------
+    prepared_graph : PreparedGraph
+        Returns the prepared graph.
+    """
+    if isinstance(graph, PreparedGraph):
+        return graph
+    if isinstance(graph, tuple):
+        return PreparedGraph.from_arrays(*graph)
+    return PreparedGraph.from_graph(graph)
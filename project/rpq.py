@@ -1,76 +1,500 @@
-from networkx import MultiDiGraph
+from functools import partial
+
+import numpy as np
 from pyformlang.regular_expression import Regex
-from project.bool_matrix import BoolMatrix
-from project.fa_utils import create_minimal_dfa, create_nfa
+from project.bool_matrix import BoolMatrix, unique_pairs
+from project.cache import LRUCache
+from project.fa_utils import create_minimal_dfa
+from project.glushkov import glushkov_matrix, positions_amount
+from project.parallel import WorkerPool
+from project.prepared_graph import prepare_graph
+
+REGEX_CACHE = LRUCache(maxsize=256)
+GLUSHKOV_POSITIONS = 32
+FRONTIER_THRESHOLD = 0.05
+ITER_BATCH_SIZE = 256
+
+
+def regex_key(regex) -> str:
+    """Normalized text of a regular expression.
+
+    Parameters
+    ----------
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    Returns
+    -------
+    key : str
+        Returns the text with collapsed whitespace, or the fully parenthesized
+        form of a parsed expression.
+    """
+    if isinstance(regex, str):
+        return " ".join(regex.split())
+    return str(regex)
+
+
+def compile_regex(
+    regex, cache: LRUCache = REGEX_CACHE, automaton: str = "dfa"
+) -> BoolMatrix:
+    """Builds Boolean matrices of an automaton of a regular expression.
+
+    Parameters
+    ----------
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    cache : LRUCache
+        Cache of the compiled expressions by automaton and regex_key, None to
+        always compile.
+    automaton : str
+        "dfa" for the minimal DFA built by pyformlang, "glushkov" for the
+        position automaton built directly, and "auto" for the position
+        automaton of expressions with more than GLUSHKOV_POSITIONS symbol
+        occurrences, whose determinization gets expensive.
+    Returns
+    -------
+    regex_bm : BoolMatrix
+        Returns the decomposition of the automaton. It is shared by every
+        query of the same expression and must not be modified.
+    """
+
+    def build():
+        parsed = Regex(regex) if isinstance(regex, str) else regex
+        kind = automaton
+        if kind == "auto":
+            is_large = positions_amount(parsed) > GLUSHKOV_POSITIONS
+            kind = "glushkov" if is_large else "dfa"
+        if kind == "glushkov":
+            return glushkov_matrix(parsed)
+        if kind == "dfa":
+            return BoolMatrix(create_minimal_dfa(parsed))
+        raise ValueError(f"Unknown regex automaton: {automaton}")
+
+    if cache is None:
+        return build()
+    return cache.get_or_create((automaton, regex_key(regex)), build)
 
 
 def rpq(
     regex: Regex,
-    graph: MultiDiGraph,
+    graph,
     start_nodes: set = None,
     final_nodes: set = None,
+    backend="auto",
+    as_arrays: bool = False,
+    alg_type: str = "auto",
+    frontier_threshold: float = FRONTIER_THRESHOLD,
+    automaton: str = "auto",
 ):
     """
     Perform regular queries on graphs.
 
     Parameters
     ----------
-    regex : Regex
-        Regular expression from pyformlang.
-    graph : MultiDiGraph
-        Graph from networkx.
-    start_nodes : set
-        Start states of finite automaton.
-    final_nodes : set
-        Final states of finite automaton.
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Graph from networkx, a graph prepared for many queries or arrays
+        (src, dst, label_ids, labels) of its edges.
+    start_nodes : set | np.ndarray
+        Start states of finite automaton, or their mask.
+    final_nodes : set | np.ndarray
+        Final states of finite automaton, or their mask.
+    backend : str | MatrixBackend
+        Matrix backend of the intersection and closure.
+    as_arrays : bool
+        Whether to return NumPy arrays of start and end nodes instead of a set.
+    alg_type : str
+        "tensor" closes the Kronecker product of the graph and the regex.
+        "frontier" propagates a front over their implicit product from the
+        start nodes only, "backward" from the final nodes over the reversed
+        graph and regex, and "bidirectional" from both ends at once. "auto"
+        chooses by the numbers of start and final nodes.
+    frontier_threshold : float
+        Largest share of start or final nodes among all nodes for which "auto"
+        searches from them instead of closing the whole product.
+    automaton : str
+        Automaton of the regex, "dfa", "glushkov" or "auto", see compile_regex.
     Returns
     -------
     result : any
         Returns pairs of nodes from the given start and end nodes
         that are connected by a path generated using regex.
     """
-    graph_fa = create_nfa(graph, start_nodes, final_nodes)
-    regex_fa = create_minimal_dfa(regex)
+    graph = prepare_graph(graph)
+    graph_bm = graph.query(start_nodes, final_nodes)
+    regex_bm = compile_regex(regex, automaton=automaton)
+    alg_type = _choose_alg_type(graph_bm, alg_type, frontier_threshold)
 
-    graph_bm = BoolMatrix(graph_fa)
-    regex_bm = BoolMatrix(regex_fa)
+    if alg_type == "frontier":
+        pairs = list(graph_bm.frontier_search(regex_bm, backend=backend))
+        first, second = unique_pairs(
+            np.concatenate([first for first, _ in pairs] or [[]]),
+            np.concatenate([second for _, second in pairs] or [[]]),
+        )
+    elif alg_type == "backward":
+        reverse = graph.query(start_nodes, final_nodes, reverse=True)
+        pairs = list(reverse.frontier_search(regex_bm.reverse(), backend=backend))
+        first, second = unique_pairs(
+            np.concatenate([second for _, second in pairs] or [[]]),
+            np.concatenate([first for first, _ in pairs] or [[]]),
+        )
+    elif alg_type == "bidirectional":
+        first, second = graph_bm.bidirectional_search(
+            regex_bm, graph.query(start_nodes, final_nodes, reverse=True), backend
+        )
+    else:
+        intersection = graph_bm.intersect(regex_bm, backend)
 
-    intersection = graph_bm.intersect(regex_bm)
+        rows, cols = intersection.transitive_closure(backend=backend).nonzero()
+        mask = intersection.start_mask[rows] & intersection.final_mask[cols]
+        first, second = unique_pairs(
+            rows[mask] // regex_bm.states_amount,
+            cols[mask] // regex_bm.states_amount,
+        )
 
-    start_states = intersection.start_states
-    final_states = intersection.final_states
+    return _rpq_result(graph_bm, first, second, as_arrays)
 
-    result = {
-        (first // regex_bm.states_amount, second // regex_bm.states_amount)
-        for first, second in zip(*intersection.transitive_closure().nonzero())
-        if first in start_states and second in final_states
-    }
 
-    return result
+def rpq_iter(
+    regex: Regex,
+    graph,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    backend="auto",
+    batch_size: int = ITER_BATCH_SIZE,
+    limit: int = None,
+    exists: bool = False,
+    automaton: str = "auto",
+):
+    """
+    Perform regular queries on graphs yielding pairs as they are found.
+    The traversal advances only while the pairs are consumed, so it stops as
+    soon as the caller stops iterating.
+
+    Parameters
+    ----------
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Graph from networkx, a graph prepared for many queries or arrays
+        (src, dst, label_ids, labels) of its edges.
+    start_nodes : set | np.ndarray
+        Start states of finite automaton, or their mask.
+    final_nodes : set | np.ndarray
+        Final states of finite automaton, or their mask.
+    backend : str | MatrixBackend
+        Matrix backend of the traversal.
+    batch_size : int
+        Number of start nodes traversed at once. Only the pairs of one batch
+        are kept in memory to skip repeated ones.
+    limit : int
+        Largest number of pairs to yield, all of them by default.
+    exists : bool
+        Whether only the existence of a pair is of interest. The first pair
+        found is yielded and, as all start nodes are traversed at once, it
+        is found at the smallest possible depth.
+    automaton : str
+        Automaton of the regex, "dfa", "glushkov" or "auto", see compile_regex.
+    Returns
+    -------
+    result : Iterator[Tuple[any, any]]
+        Yields distinct pairs of nodes connected by a path generated using
+        regex.
+    """
+    if exists:
+        batch_size, limit = None, 1
+    if limit is not None and limit <= 0:
+        return
+
+    graph_bm = prepare_graph(graph).query(start_nodes, final_nodes)
+    regex_bm = compile_regex(regex, automaton=automaton)
+
+    count = 0
+    for first, second in graph_bm.frontier_search(regex_bm, batch_size, backend):
+        if limit is not None:
+            first, second = first[: limit - count], second[: limit - count]
+        for i, j in zip(first.tolist(), second.tolist()):
+            yield graph_bm.states[i], graph_bm.states[j]
+        count += len(first)
+        if limit is not None and count >= limit:
+            return
+
+
+def rpq_batch(
+    regexes,
+    graph,
+    start_nodes: set = None,
+    final_nodes: set = None,
+    backend="auto",
+    as_arrays: bool = False,
+    alg_type: str = "auto",
+    frontier_threshold: float = FRONTIER_THRESHOLD,
+    workers: int = None,
+    executor: str = "auto",
+):
+    """
+    Perform many regular queries on one graph.
+    The graph is prepared once and, for the tensor algorithm, the DFAs of the
+    queries are stacked block-diagonally into one automaton, so a single
+    product and closure answers all of them.
+
+    Parameters
+    ----------
+    regexes : Iterable[Regex | str]
+        Regular expressions of the queries.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Graph from networkx, a graph prepared for many queries or arrays
+        (src, dst, label_ids, labels) of its edges.
+    start_nodes : set | np.ndarray
+        Start states of finite automaton, or their mask.
+    final_nodes : set | np.ndarray
+        Final states of finite automaton, or their mask.
+    backend : str | MatrixBackend
+        Matrix backend of the intersection and closure.
+    as_arrays : bool
+        Whether to return NumPy arrays of start and end nodes instead of sets.
+    alg_type : str
+        Algorithm of the queries, as in rpq. Only "tensor" stacks them.
+    frontier_threshold : float
+        Largest share of start nodes for which "auto" chooses frontier.
+    workers : int
+        Number of workers. The queries are split into a contiguous chunk per
+        worker and every chunk is stacked separately.
+    executor : str
+        Pool of the workers, "thread", "process" or "auto". A process receives
+        the graph pickled with its chunk, which copies the matrices of a graph
+        held in memory into every chunk, while a graph loaded with
+        PreparedGraph.load(path, mmap=True) is sent as its path and mapped
+        by the process. "auto" uses processes only for such a graph.
+    Returns
+    -------
+    result : list
+        Returns the result of rpq for every query in the given order.
+    """
+    graph = prepare_graph(graph)
+    if executor == "auto":
+        executor = "thread" if graph.path is None else "process"
+    regexes = list(regexes)
+    if not regexes:
+        return []
+    chunks_amount = max(min(workers or 1, len(regexes)), 1)
+    bounds = np.linspace(0, len(regexes), chunks_amount + 1).astype(int)
+    chunks = [regexes[begin:end] for begin, end in zip(bounds, bounds[1:])]
+
+    evaluate = partial(
+        _rpq_stacked,
+        graph=graph,
+        start_nodes=start_nodes,
+        final_nodes=final_nodes,
+        backend=backend,
+        as_arrays=as_arrays,
+        alg_type=alg_type,
+        frontier_threshold=frontier_threshold,
+    )
+    with WorkerPool(workers, executor) as pool:
+        results = pool.map(evaluate, chunks)
+
+    return [result for chunk in results for result in chunk]
+
+
+def _rpq_stacked(
+    regexes,
+    graph,
+    start_nodes,
+    final_nodes,
+    backend,
+    as_arrays,
+    alg_type,
+    frontier_threshold,
+):
+    """Answers a chunk of queries of rpq_batch.
+
+    Parameters
+    ----------
+    regexes : list
+        Regular expressions of the queries.
+    graph : PreparedGraph
+        Prepared graph.
+    Other parameters are the same as of rpq_batch.
+    Returns
+    -------
+    result : list
+        Returns the result of every query.
+    """
+    graph_bm = graph.query(start_nodes, final_nodes)
+    alg_type = _choose_alg_type(graph_bm, alg_type, frontier_threshold)
+    if alg_type != "tensor":
+        return [
+            rpq(
+                regex,
+                graph,
+                start_nodes,
+                final_nodes,
+                backend,
+                as_arrays,
+                alg_type,
+            )
+            for regex in regexes
+        ]
+
+    regex_bm, owners = _stack_automata([compile_regex(regex) for regex in regexes])
+    intersection = graph_bm.intersect(regex_bm, backend)
+
+    rows, cols = intersection.transitive_closure(backend=backend).nonzero()
+    mask = intersection.start_mask[rows] & intersection.final_mask[cols]
+    rows, cols = rows[mask], cols[mask]
+    queries = owners[cols % regex_bm.states_amount]
+
+    results = []
+    for query in range(len(regexes)):
+        first, second = unique_pairs(
+            rows[queries == query] // regex_bm.states_amount,
+            cols[queries == query] // regex_bm.states_amount,
+        )
+        results.append(_rpq_result(graph_bm, first, second, as_arrays))
+    return results
+
+
+def _stack_automata(bool_matrices: list):
+    """Builds the block-diagonal union of automata.
+
+    Parameters
+    ----------
+    bool_matrices : list
+        Boolean decompositions of the automata.
+    Returns
+    -------
+    union : BoolMatrix
+        Returns the union with states numbered consecutively by automata.
+    owners : np.ndarray
+        Returns the index of the automaton of every state of the union.
+    """
+    sizes = [bool_matrix.states_amount for bool_matrix in bool_matrices]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    src, dst = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    labels = []
+
+    for offset, bool_matrix in zip(offsets, bool_matrices):
+        for symbol, matrix in bool_matrix.bool_matrix.items():
+            rows, cols = matrix.nonzero()
+            src.append(rows + offset)
+            dst.append(cols + offset)
+            labels.extend([symbol] * len(rows))
+
+    union = BoolMatrix.from_edges(
+        np.concatenate(src),
+        np.concatenate(dst),
+        labels,
+        states=list(range(offsets[-1])),
+        start_states={
+            int(index)
+            for offset, bool_matrix in zip(offsets, bool_matrices)
+            for index in np.flatnonzero(bool_matrix.start_mask) + offset
+        },
+        final_states={
+            int(index)
+            for offset, bool_matrix in zip(offsets, bool_matrices)
+            for index in np.flatnonzero(bool_matrix.final_mask) + offset
+        },
+    )
+    return union, np.repeat(np.arange(len(bool_matrices)), sizes)
+
+
+def _choose_alg_type(graph_bm: BoolMatrix, alg_type: str, frontier_threshold: float):
+    """Resolves the "auto" algorithm of rpq by the shares of start and final nodes.
+    The search starts from the side with few nodes, or from both of them.
+
+    Parameters
+    ----------
+    graph_bm : BoolMatrix
+        Decomposition of the graph with the start and final nodes of the query.
+    alg_type : str
+        Requested algorithm.
+    frontier_threshold : float
+        Largest share of start or final nodes to search from.
+    Returns
+    -------
+    alg_type : str
+        Returns "tensor", "frontier", "backward" or "bidirectional".
+    """
+    if alg_type != "auto":
+        return alg_type
+    limit = frontier_threshold * graph_bm.states_amount
+    few_starts = np.count_nonzero(graph_bm.start_mask) <= limit
+    few_finals = np.count_nonzero(graph_bm.final_mask) <= limit
+    if few_starts and few_finals:
+        return "bidirectional"
+    if few_finals:
+        return "backward"
+    return "frontier" if few_starts else "tensor"
+
+
+def _rpq_result(graph_bm: BoolMatrix, first, second, as_arrays: bool):
+    """Converts indices of the answer pairs to nodes.
+
+    Parameters
+    ----------
+    graph_bm : BoolMatrix
+        Decomposition of the graph.
+    first : np.ndarray
+        Indices of the start nodes of the pairs.
+    second : np.ndarray
+        Indices of the final nodes of the pairs.
+    as_arrays : bool
+        Whether to return NumPy arrays of nodes instead of a set.
+    Returns
+    -------
+    result : set | Tuple[np.ndarray, np.ndarray]
+        Returns the pairs of nodes.
+    """
+    if as_arrays:
+        states = graph_bm.states_array()
+        return states[first], states[second]
+
+    return {
+        (graph_bm.states[i], graph_bm.states[j])
+        for i, j in zip(first.tolist(), second.tolist())
+    }
 
 
 def bfs_rpq(
     regex: Regex,
-    graph: MultiDiGraph,
+    graph,
     start_nodes: set = None,
     final_nodes: set = None,
     is_separate: bool = False,
+    batch_size: int = None,
+    backend="auto",
+    as_arrays: bool = False,
+    workers: int = None,
+    executor: str = "thread",
 ):
     """
     Perform regular queries on graphs.
 
     Parameters
     ----------
-    regex : Regex
-        Regular expression from pyformlang.
-    graph : MultiDiGraph
-        Graph from networkx.
-    start_nodes : set
-        Start states of finite automaton.
-    final_nodes : set
-        Final states of finite automaton.
+    regex : Regex | str
+        Regular expression from pyformlang or its text.
+    graph : MultiDiGraph | PreparedGraph | tuple
+        Graph from networkx, a graph prepared for many queries or arrays
+        (src, dst, label_ids, labels) of its edges.
+    start_nodes : set | np.ndarray
+        Start states of finite automaton, or their mask.
+    final_nodes : set | np.ndarray
+        Final states of finite automaton, or their mask.
     is_separate : bool
         Flag represented type of solving problem
+    batch_size : int
+        Number of start nodes traversed at once when is_separate is set.
+    backend : str | MatrixBackend
+        Matrix backend of the traversal.
+    as_arrays : bool
+        Whether to return NumPy arrays of nodes instead of a set.
+    workers : int
+        Number of workers multiplying by the matrices of different labels.
+    executor : str
+        Pool of the workers, "thread" or "process".
     Returns
     -------
     result : any
@@ -78,12 +502,11 @@ def bfs_rpq(
         for the initial state and the second element is responsible for the final state. pairs of states,
         where the first element is responsible for the initial state and the second for the final state.
     """
-    graph_fa = create_nfa(graph, start_nodes, final_nodes)
-    regex_fa = create_minimal_dfa(regex)
-
-    graph_bm = BoolMatrix(graph_fa)
-    regex_bm = BoolMatrix(regex_fa)
+    graph_bm = prepare_graph(graph).query(start_nodes, final_nodes)
+    regex_bm = compile_regex(regex)
 
-    result = graph_bm.constraint_bfs(regex_bm, is_separate)
+    result = graph_bm.constraint_bfs(
+        regex_bm, is_separate, batch_size, backend, as_arrays, workers, executor
+    )
 
     return result
@@ -0,0 +1,247 @@
+import numpy as np
+from pyformlang.regular_expression import Regex
+from scipy import sparse
+
+from project.bool_matrix import _closure_insert, _transitive_closure, unique_pairs
+from project.prepared_graph import prepare_graph
+from project.rpq import compile_regex
+
+RECOMPUTE_SHARE = 0.25
+
+
+class RpqView:
+    """
+    A class representing the result of a regular path query kept up to date
+    while edges of the graph are inserted and deleted
+    """
+
+    def __init__(
+        self,
+        regex: Regex,
+        graph=None,
+        start_nodes: set = None,
+        final_nodes: set = None,
+        backend="auto",
+        recompute_share: float = RECOMPUTE_SHARE,
+    ):
+        """
+        Parameters
+        ----------
+        regex : Regex | str
+            Regular expression from pyformlang or its text.
+        graph : MultiDiGraph | PreparedGraph | tuple
+            Initial graph, empty by default. Parallel edges of a prepared
+            graph or of arrays are merged.
+        start_nodes : set
+            Start nodes. If both start and final nodes are None, every node,
+            including the inserted ones, is start and final.
+        final_nodes : set
+            Final nodes.
+        backend : str | MatrixBackend
+            Matrix backend of the initial closure.
+        recompute_share : float
+            Largest share of product states whose closure rows are recomputed
+            after a deletion, the whole closure is recomputed above it.
+        """
+        self.regex_bm = compile_regex(regex)
+        self.start_nodes = start_nodes
+        self.final_nodes = final_nodes
+        self.recompute_share = recompute_share
+        self.nodes = []
+        self.nodes_dict = {}
+        self.edges = {}
+        self.adjacency = self._empty()
+        self.closure = self._empty()
+
+        if graph is not None:
+            edges = list(graph.edges(data="label")) if hasattr(graph, "edges") else None
+            graph = prepare_graph(graph)
+            if edges is None:
+                edges = list(graph.labeled_edges())
+            self._add_nodes(graph.nodes)
+            for edge in edges:
+                self.edges[edge] = self.edges.get(edge, 0) + 1
+            self.adjacency = self._product_edges(edges)
+            self.closure = (
+                graph.query()
+                .intersect(self.regex_bm, backend)
+                .transitive_closure(backend=backend)
+            )
+            if self.closure.shape != self.adjacency.shape:
+                self.closure = self._empty()
+
+    @property
+    def size(self) -> int:
+        """
+        Number of states of the product of the graph and the regex.
+        """
+        return len(self.nodes) * self.regex_bm.states_amount
+
+    def insert(self, edges):
+        """
+        Add edges to the graph and propagate only the new reachability,
+        see _closure_insert.
+
+        Parameters
+        ----------
+        edges : Iterable[Tuple[any, any, any]]
+            Triples of source, destination and label.
+        """
+        edges = list(edges)
+        self._add_nodes(node for u, v, _ in edges for node in (u, v))
+        for edge in edges:
+            self.edges[edge] = self.edges.get(edge, 0) + 1
+
+        new = self._product_edges(edges) > self.adjacency
+        if new.nnz == 0:
+            return
+        self.adjacency = self.adjacency + new
+        self.closure, _ = _closure_insert(self.closure, new)
+
+    def delete(self, edges):
+        """
+        Remove edges from the graph. Only the closure rows of product states
+        reaching a removed edge are recomputed, or the whole closure if they
+        make up more than recompute_share of the states.
+
+        Parameters
+        ----------
+        edges : Iterable[Tuple[any, any, any]]
+            Triples of source, destination and label. Every triple removes
+            one copy of a parallel edge.
+        """
+        removed = []
+        for edge in edges:
+            if self.edges.get(edge, 0) == 0:
+                raise ValueError(f"Edge {edge} is not in the graph")
+            self.edges[edge] -= 1
+            if self.edges[edge] == 0:
+                del self.edges[edge]
+                removed.append(edge)
+
+        kept = [
+            (u, v, label)
+            for u, v in {(u, v) for u, v, _ in removed}
+            for label in self._labels_between(u, v)
+        ]
+        lost = self._product_edges(removed) > self._product_edges(kept)
+        if lost.nnz == 0:
+            return
+        self.adjacency = self.adjacency > lost
+
+        tails = np.unique(lost.nonzero()[0])
+        reaching = self.closure[:, tails].tocsr().nonzero()[0]
+        affected = np.union1d(tails, reaching)
+        if len(affected) > self.recompute_share * self.size:
+            self.closure, _ = _transitive_closure(self.adjacency)
+            return
+
+        rows = _closure_rows(affected, self.adjacency)
+        keep = np.ones(self.size, dtype=bool)
+        keep[affected] = False
+        placement = sparse.csr_matrix(
+            (np.ones(len(affected), dtype=bool), (affected, np.arange(len(affected)))),
+            shape=(self.size, len(affected)),
+        )
+        self.closure = sparse.diags(keep, dtype=bool, format="csr") @ self.closure
+        self.closure = self.closure + placement @ rows
+
+    def result(self) -> set:
+        """
+        Current result of the query.
+
+        Returns
+        -------
+        result : set
+            Returns pairs of start and final nodes connected by a path
+            generated using regex.
+        """
+        k = self.regex_bm.states_amount
+        if self.start_nodes is None and self.final_nodes is None:
+            start_mask = final_mask = np.ones(len(self.nodes), dtype=bool)
+        else:
+            start_mask = self._mask(self.start_nodes or ())
+            final_mask = self._mask(self.final_nodes or ())
+
+        rows, cols = self.closure.nonzero()
+        mask = (
+            start_mask[rows // k]
+            & self.regex_bm.start_mask[rows % k]
+            & final_mask[cols // k]
+            & self.regex_bm.final_mask[cols % k]
+        )
+        first, second = unique_pairs(rows[mask] // k, cols[mask] // k)
+        return {
+            (self.nodes[i], self.nodes[j])
+            for i, j in zip(first.tolist(), second.tolist())
+        }
+
+    def _mask(self, nodes) -> np.ndarray:
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        mask[
+            [self.nodes_dict[node] for node in nodes if node in self.nodes_dict]
+        ] = True
+        return mask
+
+    def _empty(self):
+        return sparse.csr_matrix((self.size, self.size), dtype=bool)
+
+    def _add_nodes(self, nodes):
+        """
+        Index new nodes, growing the matrices. Product states are numbered
+        node-major, so the existing indices stay valid.
+        """
+        for node in nodes:
+            if node not in self.nodes_dict:
+                self.nodes_dict[node] = len(self.nodes)
+                self.nodes.append(node)
+        if self.adjacency.shape[0] != self.size:
+            self.adjacency.resize((self.size, self.size))
+            self.closure.resize((self.size, self.size))
+
+    def _labels_between(self, u, v):
+        return [
+            label
+            for label in self.regex_bm.bool_matrix
+            if self.edges.get((u, v, label), 0) > 0
+        ]
+
+    def _product_edges(self, edges):
+        """
+        Adjacency matrix of the product edges of the given graph edges.
+        """
+        k = self.regex_bm.states_amount
+        rows, cols = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for u, v, label in edges:
+            if label not in self.regex_bm.bool_matrix:
+                continue
+            p, q = self.regex_bm.bool_matrix[label].nonzero()
+            rows.append(self.nodes_dict[u] * k + p)
+            cols.append(self.nodes_dict[v] * k + q)
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=(self.size, self.size),
+            dtype=bool,
+        )
+
+
+def _closure_rows(sources, adjacency):
+    """Rows of the transitive closure for the given product states.
+
+    Parameters
+    ----------
+    sources : np.ndarray
+        Indices of the product states.
+    adjacency : csr_matrix
+        Adjacency matrix of the product.
+    Returns
+    -------
+    rows : csr_matrix
+        Returns the states reachable by nonempty paths from every source.
+    """
+    reached = front = adjacency[sources]
+    while front.nnz > 0:
+        front = (front @ adjacency) > reached
+        reached = reached + front
+    return reached
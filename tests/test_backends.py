@@ -0,0 +1,39 @@
+import pytest
+from scipy import sparse
+from project.backends import get_backend, choose_backend
+
+
+def random_matrix(rows, cols, seed):
+    return sparse.random(
+        rows, cols, density=0.3, format="csr", random_state=seed
+    ).astype(bool)
+
+
+class TestsBackends:
+    @pytest.mark.parametrize("name", ["scipy", "dense", "bitset"])
+    def test_operations(self, name):
+        backend = get_backend(name)
+        first, second = random_matrix(6, 6, 0), random_matrix(6, 6, 1)
+        bfirst, bsecond = backend.from_sparse(first), backend.from_sparse(second)
+
+        expected = {
+            "matmul": first @ second,
+            "kron": sparse.kron(first, second),
+            "add": first + second,
+            "difference": first > second,
+        }
+        for operation, matrix in expected.items():
+            actual = backend.to_sparse(getattr(backend, operation)(bfirst, bsecond))
+            assert (actual != matrix).nnz == 0
+
+        rows, cols = backend.nonzero(bfirst)
+        assert backend.nnz(bfirst) == first.nnz
+        assert set(zip(rows, cols)) == set(zip(*first.nonzero()))
+        assert backend.nnz(backend.eye(4)) == 4
+
+    def test_choose_backend(self):
+        assert choose_backend("auto", 0.001).name == "scipy"
+        assert choose_backend("auto", 0.9).name == "bitset"
+        assert choose_backend("dense", 0.001).name == "dense"
+        with pytest.raises(ValueError):
+            get_backend("unknown")
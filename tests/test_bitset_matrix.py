@@ -0,0 +1,44 @@
+import pytest
+from scipy import sparse
+from project.bitset_matrix import BitMatrix
+
+
+def random_matrix(rows, cols, seed, density=0.2):
+    return sparse.random(
+        rows, cols, density=density, format="csr", random_state=seed
+    ).astype(bool)
+
+
+class TestsBitMatrix:
+    @pytest.mark.parametrize("rows, cols", [(0, 0), (3, 5), (70, 130)])
+    def test_conversions(self, rows, cols):
+        matrix = random_matrix(rows, cols, 0)
+        bit_matrix = BitMatrix.from_sparse(matrix)
+
+        assert bit_matrix.nnz == matrix.nnz
+        assert (bit_matrix.to_sparse() != matrix).nnz == 0
+        assert (BitMatrix.from_dense(matrix.toarray()).to_dense() == matrix).all()
+
+    @pytest.mark.parametrize("n, k, m", [(5, 7, 3), (40, 130, 65)])
+    def test_matmul(self, n, k, m):
+        first, second = random_matrix(n, k, 1), random_matrix(k, m, 2)
+
+        product = BitMatrix.from_sparse(first) @ BitMatrix.from_sparse(second)
+
+        assert (product.to_sparse() != (first @ second)).nnz == 0
+
+    @pytest.mark.parametrize("second_cols", [3, 64])
+    def test_kron(self, second_cols):
+        first, second = random_matrix(4, 5, 3, 0.5), random_matrix(3, second_cols, 4)
+
+        product = BitMatrix.from_sparse(first).kron(BitMatrix.from_sparse(second))
+
+        assert (product.to_sparse() != sparse.kron(first, second)).nnz == 0
+
+    def test_add_and_difference(self):
+        first, second = random_matrix(10, 70, 5), random_matrix(10, 70, 6)
+        bit_first = BitMatrix.from_sparse(first)
+        bit_second = BitMatrix.from_sparse(second)
+
+        assert ((bit_first + bit_second).to_sparse() != (first + second)).nnz == 0
+        assert ((bit_first > bit_second).to_sparse() != (first > second)).nnz == 0
@@ -1,7 +1,31 @@
-from project.bool_matrix import BoolMatrix
+import pytest
+from scipy import sparse
+from scipy.sparse import lil_array
+from project.bool_matrix import (
+    BoolMatrix,
+    _closure_insert,
+    _transform_front,
+    _transitive_closure,
+)
 from pyformlang.finite_automaton import *
 
 
+def _loop_transform_front(front, amount):
+    new_front = lil_array(front.shape)
+
+    rows, cols = front.nonzero()
+    for i, j in zip(rows, cols):
+        if j < amount:
+            row = front.getrow(i).tolil()[[0], amount:]
+
+            if row.nnz > 0:
+                shift_row = i // amount * amount
+                new_front[shift_row + j, j] = 1
+                new_front[[shift_row + j], amount:] += row
+
+    return new_front.tocsr()
+
+
 class TestsForBoolMatrix:
     def test_empty_nfa(self):
         nfa = NondeterministicFiniteAutomaton()
@@ -110,3 +134,128 @@ class TestsForBoolMatrix:
         bool_matrix = BoolMatrix(nfa)
         transitive_closure = bool_matrix.transitive_closure()
         assert transitive_closure.sum() == transitive_closure.size
+
+    def test_from_edges(self):
+        nfa = NondeterministicFiniteAutomaton()
+        nfa.add_transitions([(0, "a", 1), (1, "b", 2), (0, "a", 2), (2, "a", 0)])
+        nfa.add_start_state(State(0))
+        nfa.add_final_state(State(2))
+        expected = BoolMatrix(nfa)
+
+        actual = BoolMatrix.from_edges(
+            [0, 1, 0, 2, 0],
+            [1, 2, 2, 0, 1],
+            ["a", "b", "a", "a", "a"],
+            start_states={0},
+            final_states={2},
+        )
+
+        assert actual.states_amount == 3
+        assert actual.start_states == expected.start_states
+        assert actual.final_states == expected.final_states
+        assert actual.bool_matrix.keys() == expected.bool_matrix.keys()
+        for symbol, matrix in actual.bool_matrix.items():
+            indexes = [expected.states_dict[state] for state in actual.states]
+            expected_matrix = expected.bool_matrix[symbol][indexes][:, indexes]
+            assert (matrix != expected_matrix).nnz == 0
+
+    def test_intersect_masks(self):
+        first = BoolMatrix.from_edges(
+            [0, 1], [1, 2], ["a", "b"], start_states={0, 1}, final_states={2}
+        )
+        second = BoolMatrix.from_edges(
+            [0, 1], [1, 1], ["a", "b"], start_states={0}, final_states={1}
+        )
+
+        intersection = first.intersect(second)
+
+        assert intersection.start_mask.tolist() == [
+            True,
+            False,
+            True,
+            False,
+            False,
+            False,
+        ]
+        assert intersection.final_mask.tolist() == [False] * 5 + [True]
+        assert intersection.start_states == {0, 2}
+        assert intersection.final_states == {5}
+
+    def test_transitive_closure_modes(self):
+        bool_matrix = BoolMatrix.from_edges(
+            [0, 1, 2, 3, 4, 2], [1, 2, 3, 4, 0, 5], ["a", "b", "a", "b", "a", "a"]
+        )
+        expected = bool_matrix.transitive_closure("squaring")
+
+        for mode in ["squaring", "delta", "auto"]:
+            closure, iterations = bool_matrix.transitive_closure(
+                mode, return_iterations=True
+            )
+            assert (closure != expected).nnz == 0
+            assert iterations > 0
+        assert closure.nnz == 5 * 6
+
+    def test_transitive_closure_long_path(self):
+        size = 64
+        chain = sparse.csr_matrix(
+            ([True] * (size - 1), (range(size - 1), range(1, size))),
+            shape=(size, size),
+            dtype=bool,
+        )
+        closure, iterations = _transitive_closure(chain, "auto")
+        assert closure.nnz == size * (size - 1) // 2
+        assert iterations <= 2 * size.bit_length()
+
+    def test_closure_insert(self):
+        first = sparse.csr_matrix(
+            ([True] * 3, ([0, 1, 3], [1, 2, 4])), shape=(6, 6), dtype=bool
+        )
+        second = sparse.csr_matrix(
+            ([True] * 3, ([2, 4, 5], [3, 0, 5])), shape=(6, 6), dtype=bool
+        )
+        closure, _ = _transitive_closure(first)
+        expected, _ = _transitive_closure(first + second)
+
+        closure, added = _closure_insert(closure, second)
+        assert (closure != expected).nnz == 0
+        assert (added != (expected > _transitive_closure(first)[0])).nnz == 0
+
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_save_load(self, tmp_path, mmap):
+        nfa = NondeterministicFiniteAutomaton()
+        nfa.add_transitions([(0, "a", 1), (1, "b", 2), (0, "a", 2), (2, "a", 0)])
+        nfa.add_start_state(State(0))
+        nfa.add_final_state(State(2))
+        expected = BoolMatrix(nfa)
+
+        for bool_matrix in [expected, expected.intersect(expected)]:
+            bool_matrix.save(tmp_path / "matrix")
+            actual = BoolMatrix.load(tmp_path / "matrix", mmap=mmap)
+
+            assert actual.states == bool_matrix.states
+            assert actual.start_states == bool_matrix.start_states
+            assert actual.final_states == bool_matrix.final_states
+            assert actual.bool_matrix.keys() == bool_matrix.bool_matrix.keys()
+            for symbol, matrix in actual.bool_matrix.items():
+                assert (matrix != bool_matrix.bool_matrix[symbol]).nnz == 0
+            assert (
+                actual.transitive_closure() != bool_matrix.transitive_closure()
+            ).nnz == 0
+
+    @pytest.mark.parametrize(
+        "blocks, amount, nodes, seed", [(1, 3, 7, 0), (4, 2, 9, 1)]
+    )
+    def test_transform_front_parity(self, blocks, amount, nodes, seed):
+        front = sparse.random(
+            blocks * amount,
+            amount + nodes,
+            density=0.3,
+            format="csr",
+            random_state=seed,
+        ).astype(bool)
+
+        expected = _loop_transform_front(front, amount)
+        actual = _transform_front(front, amount)
+
+        assert actual.shape == expected.shape
+        assert (actual != expected.astype(bool)).nnz == 0
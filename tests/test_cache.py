@@ -0,0 +1,32 @@
+from project.cache import LRUCache
+
+
+class TestsForLRUCache:
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+        assert cache.get("b") is None
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 2, "maxsize": 2}
+
+    def test_get_or_create(self):
+        cache = LRUCache()
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return len(calls)
+
+        assert cache.get_or_create("key", factory) == 1
+        assert cache.get_or_create("key", factory) == 1
+        assert len(calls) == 1
+
+        cache.invalidate("key")
+        assert cache.get_or_create("key", factory) == 2
+        cache.invalidate()
+        assert len(cache) == 0
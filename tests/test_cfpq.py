@@ -1,7 +1,8 @@
 import pytest
 from networkx import MultiDiGraph
+from project.backends import ScipyBackend
 from project.cfg import CFG
-from project.cfpq import cfpq
+from project.cfpq import cfpq, hellings_closure, matrix
 
 
 class TestsCFPQ:
@@ -50,3 +51,98 @@ class TestsCFPQ:
         for alg in {"hellings", "matrix", "tensor"}:
             res_cfpq = cfpq(cfg, graph, start_nodes, final_nodes, alg_type=alg)
             assert res_cfpq == expected_cfpq
+
+    @pytest.mark.parametrize("backend", ["scipy", "dense", "bitset"])
+    def test_cfpq_backends(self, backend):
+        cfg = CFG.from_text(self.cfg)
+        graph = MultiDiGraph()
+        graph.add_edges_from(self.cfg_info[0])
+        expected_cfpq = self.testdata[0][-1]
+        for alg in {"matrix", "tensor"}:
+            res_cfpq = cfpq(cfg, graph, alg_type=alg, backend=backend)
+            assert res_cfpq == expected_cfpq
+
+    @pytest.mark.parametrize(
+        "workers,executor", [(1, "thread"), (4, "thread"), (2, "process")]
+    )
+    def test_cfpq_workers(self, workers, executor):
+        cfg = CFG.from_text(self.cfg)
+        graph = MultiDiGraph()
+        graph.add_edges_from(self.cfg_info[0])
+        res_cfpq = cfpq(
+            cfg, graph, alg_type="matrix", workers=workers, executor=executor
+        )
+        assert res_cfpq == self.testdata[0][-1]
+
+    def test_cfpq_nullable(self):
+        cfg = CFG.from_text("S -> a S b | $")
+        graph = MultiDiGraph()
+        graph.add_edges_from(
+            [
+                (0, 1, {"label": "a"}),
+                (1, 2, {"label": "a"}),
+                (2, 3, {"label": "b"}),
+                (3, 4, {"label": "b"}),
+            ]
+        )
+        expected_cfpq = {(n, n) for n in range(5)} | {(1, 3), (0, 4)}
+        for alg in {"hellings", "matrix", "tensor"}:
+            assert cfpq(cfg, graph, alg_type=alg) == expected_cfpq
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_matrix_modes(self, workers):
+        cfg = CFG.from_text(self.cfg)
+        graph = MultiDiGraph()
+        graph.add_edges_from(self.cfg_info[0])
+        naive, naive_stats = matrix(
+            cfg, graph, workers=workers, mode="naive", return_stats=True
+        )
+        delta, delta_stats = matrix(
+            cfg, graph, workers=workers, mode="delta", return_stats=True
+        )
+        assert set(naive) == set(delta)
+        assert delta_stats[-1]["new"] == 0
+        assert delta_stats[-1]["nnz"] == naive_stats[-1]["nnz"] == len(set(delta))
+
+    @pytest.mark.parametrize("mode", ["naive", "delta"])
+    def test_matrix_schedules(self, mode):
+        cfg = CFG.from_text("S -> T c | S S\nT -> a T b | a b")
+        graph = MultiDiGraph()
+        graph.add_edges_from(
+            [
+                (0, 1, {"label": "a"}),
+                (1, 2, {"label": "a"}),
+                (2, 3, {"label": "b"}),
+                (3, 4, {"label": "b"}),
+                (4, 5, {"label": "c"}),
+                (5, 0, {"label": "a"}),
+            ]
+        )
+        expected = set(hellings_closure(cfg, graph))
+        for schedule in ["global", "scc"]:
+            res, stats = matrix(
+                cfg, graph, mode=mode, schedule=schedule, return_stats=True
+            )
+            assert set(res) == expected
+        components = {(stat["component"], stat["products"]) for stat in stats}
+        assert len({component for component, _ in components}) > 1
+
+    def test_tensor_backend_rounds(self):
+        class CountingBackend(ScipyBackend):
+            name = "counting"
+
+            def __init__(self):
+                self.krons = 0
+
+            def kron(self, first, second):
+                self.krons += 1
+                return super().kron(first, second)
+
+        cfg = CFG.from_text(self.cfg)
+        graph = MultiDiGraph()
+        graph.add_edges_from(self.cfg_info[0])
+        backend = CountingBackend()
+        assert cfpq(cfg, graph, alg_type="tensor", backend=backend) == (
+            self.testdata[0][-1]
+        )
+        assert backend.krons > len({"a", "b"})
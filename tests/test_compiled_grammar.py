@@ -0,0 +1,60 @@
+from networkx import MultiDiGraph
+from project.cache import LRUCache
+from project.cfg import CFG
+from project.cfpq import cfpq
+from project.compiled_grammar import CompiledGrammar, compile_grammar, grammar_key
+
+
+class TestsForCompiledGrammar:
+    cfg = """
+            S -> A B
+            S -> A C
+            C -> S B
+            A -> a
+            B -> b
+        """
+
+    def test_grammar_key(self):
+        reordered = """
+            B -> b
+            C -> S B
+            S -> A C | A B
+            A -> a
+        """
+        assert grammar_key(self.cfg) == grammar_key(reordered)
+        assert grammar_key(self.cfg) == grammar_key(CFG.from_text(self.cfg))
+        assert grammar_key(self.cfg) != grammar_key("S -> A B\nA -> a\nB -> b")
+
+    def test_cache(self):
+        cache = LRUCache(maxsize=2)
+        first = compile_grammar(self.cfg, cache)
+        assert compile_grammar(CFG.from_text(self.cfg), cache) is first
+        assert compile_grammar(first, cache) is first
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_disk_store(self, tmp_path):
+        first = compile_grammar(self.cfg, None, tmp_path)
+        assert (tmp_path / f"{first.key}.pickle").exists()
+
+        loaded = compile_grammar(self.cfg, LRUCache(), tmp_path)
+        assert loaded is not first
+        assert loaded.key == first.key
+        assert loaded.wcnf.productions == first.wcnf.productions
+        assert loaded.rsm.states_amount == first.rsm.states_amount
+
+    def test_cfpq(self):
+        graph = MultiDiGraph()
+        graph.add_edges_from(
+            [
+                (0, 1, {"label": "a"}),
+                (1, 2, {"label": "a"}),
+                (2, 0, {"label": "a"}),
+                (2, 3, {"label": "b"}),
+                (3, 2, {"label": "b"}),
+            ]
+        )
+        grammar = CompiledGrammar(CFG.from_text(self.cfg))
+        expected = {(1, 2), (0, 3), (2, 3), (0, 2), (2, 2), (1, 3)}
+        for alg in ["hellings", "matrix", "tensor"]:
+            assert cfpq(grammar, graph, alg_type=alg) == expected
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+from networkx import MultiDiGraph
+from pyformlang.regular_expression import Regex
+from project.cache import LRUCache
+from project.fa_utils import create_minimal_dfa
+from project.glushkov import glushkov_matrix, positions_amount
+from project.rpq import GLUSHKOV_POSITIONS, compile_regex, rpq
+
+
+class TestsForGlushkov:
+    regexes = ["a b", "(a|b)* c", "a* b*", "c (a b)*", "(a|$) b", "a (b|c)* a"]
+
+    @pytest.mark.parametrize("regex", regexes)
+    def test_language(self, regex):
+        expected = create_minimal_dfa(Regex(regex))
+        actual = glushkov_matrix(regex).to_automaton()
+
+        assert len(actual.states) <= positions_amount(regex) + 1
+        assert actual.to_deterministic().minimize().is_equivalent_to(expected)
+
+    @pytest.mark.parametrize("seed", range(2))
+    def test_rpq(self, seed):
+        rng = random.Random(seed)
+        graph = MultiDiGraph()
+        graph.add_edges_from(
+            (rng.randrange(15), rng.randrange(15), {"label": rng.choice("abc")})
+            for _ in range(45)
+        )
+        for regex in self.regexes:
+            for starts, finals in [(None, None), ({0, 1, 2}, {3, 4, 5, 6})]:
+                expected = rpq(regex, graph, starts, finals, automaton="dfa")
+                for alg_type in ["tensor", "frontier", "bidirectional"]:
+                    actual = rpq(
+                        regex,
+                        graph,
+                        starts,
+                        finals,
+                        alg_type=alg_type,
+                        automaton="glushkov",
+                    )
+                    assert actual == expected
+
+    def test_auto_automaton(self):
+        cache = LRUCache()
+        small = "(a|b)* c"
+        large = " ".join(["(a|b)"] * (GLUSHKOV_POSITIONS // 2 + 1))
+
+        assert compile_regex(small, cache, "auto").states_amount == len(
+            create_minimal_dfa(Regex(small)).states
+        )
+        assert (
+            compile_regex(large, cache, "auto").states_amount
+            == positions_amount(large) + 1
+        )
@@ -0,0 +1,130 @@
+import pickle
+
+import numpy as np
+import pytest
+from networkx import MultiDiGraph
+from project.cfg import CFG
+from project.bool_matrix import LazyIndex, RangeIndex
+from project.cfpq import cfpq
+from project.prepared_graph import PreparedGraph
+from project.rpq import rpq, rpq_batch, bfs_rpq
+
+
+class TestsForPreparedGraph:
+    @staticmethod
+    def graph():
+        graph = MultiDiGraph()
+        graph.add_edges_from(
+            [
+                (0, 1, {"label": "a"}),
+                (1, 2, {"label": "a"}),
+                (2, 0, {"label": "a"}),
+                (2, 3, {"label": "b"}),
+                (3, 2, {"label": "b"}),
+                ("x", 0, {"label": "b"}),
+            ]
+        )
+        return graph
+
+    def test_query_masks(self):
+        prepared = PreparedGraph.from_graph(self.graph())
+
+        matrix = prepared.query()
+        assert matrix.start_states == matrix.final_states == {0, 1, 2, 3, "x"}
+
+        matrix = prepared.query({0, "y"}, np.array([0, 0, 0, 1, 1], dtype=bool))
+        assert matrix.start_states == {0}
+        assert matrix.final_states == {3, "x"}
+        assert prepared.query({0}).final_states == set()
+
+        with pytest.raises(ValueError):
+            prepared.query(np.ones(2, dtype=bool))
+
+    @pytest.mark.parametrize(
+        "start_nodes, final_nodes", [(None, None), ({0, 2}, {3}), ({"x"}, None)]
+    )
+    def test_rpq(self, start_nodes, final_nodes):
+        graph = self.graph()
+        prepared = PreparedGraph.from_graph(graph)
+
+        for regex in ["a* b", "b a (a|b)*"]:
+            assert rpq(regex, prepared, start_nodes, final_nodes) == rpq(
+                regex, graph, start_nodes, final_nodes
+            )
+            for is_separate in [False, True]:
+                assert bfs_rpq(
+                    regex, prepared, start_nodes, final_nodes, is_separate
+                ) == bfs_rpq(regex, graph, start_nodes, final_nodes, is_separate)
+
+    def test_cfpq(self, tmp_path):
+        cfg = CFG.from_text(
+            """
+                S -> A B
+                S -> A C
+                C -> S B
+                A -> a
+                B -> b
+            """
+        )
+        graph = self.graph()
+        PreparedGraph.from_graph(graph).save(tmp_path / "graph")
+        prepared = PreparedGraph.load(tmp_path / "graph")
+
+        for alg in ["hellings", "matrix", "tensor"]:
+            assert cfpq(cfg, prepared, alg_type=alg) == cfpq(cfg, graph, alg_type=alg)
+            assert cfpq(cfg, prepared, {0, 2}, {3}, alg_type=alg) == {(0, 3), (2, 3)}
+
+    def test_from_arrays(self):
+        graph = MultiDiGraph()
+        graph.add_nodes_from(range(6))
+        edges = [(0, 1, 0), (1, 2, 0), (2, 0, 0), (2, 3, 1), (3, 2, 1), (4, 0, 1)]
+        graph.add_edges_from((u, v, {"label": "ab"[i]}) for u, v, i in edges)
+        src, dst, label_ids = [np.array(column) for column in zip(*edges)]
+        arrays = (src, dst, label_ids, ["a", "b"], 6)
+
+        prepared = PreparedGraph.from_arrays(*arrays)
+        assert prepared.nodes_amount == 6
+        assert set(prepared.labeled_edges()) == {(u, v, "ab"[i]) for u, v, i in edges}
+        assert prepared.mask([0, 7, "x"]).tolist() == [True] + [False] * 5
+
+        assert rpq("a* b", arrays, as_arrays=True)[0].dtype == np.int64
+        for starts, finals in [(None, None), ({0, 4}, {2, 3})]:
+            assert rpq("a* b", arrays, starts, finals) == rpq(
+                "a* b", graph, starts, finals
+            )
+            assert bfs_rpq("a* b", arrays, starts, finals) == bfs_rpq(
+                "a* b", graph, starts, finals
+            )
+        cfg = CFG.from_text("S -> a S b | a b")
+        for alg in ["hellings", "matrix", "tensor"]:
+            assert cfpq(cfg, arrays, alg_type=alg) == cfpq(cfg, graph, alg_type=alg)
+
+    def test_load_index(self, tmp_path):
+        src, dst, label_ids = np.array([0, 1, 2]), np.array([1, 2, 0]), np.zeros(3)
+        PreparedGraph.from_arrays(src, dst, label_ids, ["a"]).save(tmp_path / "range")
+        prepared = PreparedGraph.load(tmp_path / "range")
+        assert isinstance(prepared.nodes, range)
+        assert isinstance(prepared.nodes_dict, RangeIndex)
+
+        graph = MultiDiGraph()
+        graph.add_edges_from([("x", "y", {"label": "a"}), ("y", "z", {"label": "b"})])
+        PreparedGraph.from_graph(graph).save(tmp_path / "names")
+        prepared = PreparedGraph.load(tmp_path / "names")
+        assert isinstance(prepared.nodes, np.ndarray)
+        assert isinstance(prepared.nodes_dict, LazyIndex)
+        assert prepared.mask(["z", "w"]).sum() == 1
+        assert rpq("a b", prepared) == {("x", "z")}
+
+    def test_pickle_mapped(self, tmp_path):
+        graph = self.graph()
+        PreparedGraph.from_graph(graph).save(tmp_path / "graph")
+        prepared = PreparedGraph.load(tmp_path / "graph")
+        copy = pickle.loads(pickle.dumps(prepared))
+        assert copy.path == prepared.path
+        assert len(pickle.dumps(prepared)) < 1024
+
+        regexes = ["a*", "a b", "b*"]
+        expected = [rpq(regex, graph) for regex in regexes]
+        for executor in ["auto", "process"]:
+            actual = rpq_batch(regexes, prepared, workers=2, executor=executor)
+            assert actual == expected
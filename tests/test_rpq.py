@@ -1,5 +1,8 @@
+import random
+import pytest
 from networkx import MultiDiGraph
-from project.rpq import rpq, bfs_rpq
+from project.cache import LRUCache
+from project.rpq import rpq, rpq_batch, rpq_iter, bfs_rpq, compile_regex
 from pyformlang.regular_expression import Regex
 from pyformlang.finite_automaton import State
 
@@ -85,3 +88,162 @@ class TestsForRpq:
         graph = MultiDiGraph()
         assert bfs_rpq(Regex("Tyler"), graph, is_separate=True) == set()
         assert bfs_rpq(Regex("Derden"), graph, is_separate=False) == set()
+
+    @pytest.mark.parametrize("batch_size", [None, 1, 2, 10])
+    def test_batched_bfs_rpq(self, batch_size):
+        regex = Regex("a b")
+        graph = self.test_graph_for_bfs_rpq()
+
+        result = bfs_rpq(regex, graph, is_separate=True, batch_size=batch_size)
+        assert result == {(0, 2), (0, 5), (2, 4), (3, 0)}
+        assert bfs_rpq(regex, graph) == {0, 2, 4, 5}
+
+    @pytest.mark.parametrize("backend", ["scipy", "dense", "bitset"])
+    def test_rpq_backends(self, backend):
+        regex = Regex("a b")
+        graph = self.test_graph_for_bfs_rpq()
+        expected = {(0, 2), (0, 5), (2, 4), (3, 0)}
+
+        assert rpq(regex, graph, backend=backend) == expected
+        assert bfs_rpq(regex, graph, is_separate=True, backend=backend) == expected
+        assert bfs_rpq(regex, graph, backend=backend) == {0, 2, 4, 5}
+
+    def test_rpq_as_arrays(self):
+        regex = Regex("a b")
+        graph = self.test_graph_for_bfs_rpq()
+        expected = {(0, 2), (0, 5), (2, 4), (3, 0)}
+
+        starts, finals = rpq(regex, graph, as_arrays=True)
+        assert set(zip(starts.tolist(), finals.tolist())) == expected
+        assert len(starts) == len(expected)
+
+        starts, finals = bfs_rpq(regex, graph, is_separate=True, as_arrays=True)
+        assert set(zip(starts.tolist(), finals.tolist())) == expected
+
+        reachable = bfs_rpq(regex, graph, as_arrays=True)
+        assert sorted(reachable.tolist()) == [0, 2, 4, 5]
+
+    @staticmethod
+    def random_graph(nodes, edges, seed):
+        rng = random.Random(seed)
+        graph = MultiDiGraph()
+        graph.add_nodes_from(range(nodes))
+        graph.add_edges_from(
+            (rng.randrange(nodes), rng.randrange(nodes), {"label": rng.choice("abc")})
+            for _ in range(edges)
+        )
+        return graph
+
+    @pytest.mark.parametrize("seed", range(3))
+    @pytest.mark.parametrize("regex", ["a b", "(a|b)* c", "a* b*", "c (a b)*"])
+    def test_frontier_rpq(self, seed, regex):
+        graph = self.random_graph(12, 30, seed)
+        start_nodes, final_nodes = {0, 3, 5, 7}, {1, 2, 3, 8, 11}
+        for starts, finals in [(None, None), (start_nodes, final_nodes)]:
+            expected = rpq(Regex(regex), graph, starts, finals)
+            actual = rpq(Regex(regex), graph, starts, finals, alg_type="frontier")
+            assert actual == expected
+
+    @pytest.mark.parametrize(
+        "workers,executor", [(1, "thread"), (4, "thread"), (2, "process")]
+    )
+    def test_parallel_bfs_rpq(self, workers, executor):
+        graph = self.random_graph(12, 30, 0)
+        for regex in ["a b", "(a|b)* c"]:
+            for is_separate in [False, True]:
+                expected = bfs_rpq(Regex(regex), graph, is_separate=is_separate)
+                actual = bfs_rpq(
+                    Regex(regex),
+                    graph,
+                    is_separate=is_separate,
+                    workers=workers,
+                    executor=executor,
+                )
+                assert actual == expected
+
+    def test_compile_regex_cache(self):
+        cache = LRUCache(maxsize=2)
+        first = compile_regex("a  b", cache)
+        assert compile_regex(" a b ", cache) is first
+        assert compile_regex(Regex("a b"), cache) is not first
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+        graph = self.test_graph_for_bfs_rpq()
+        expected = {(0, 2), (0, 5), (2, 4), (3, 0)}
+        assert rpq("a b", graph) == expected
+        assert rpq(Regex("a b"), graph) == expected
+
+    @pytest.mark.parametrize("seed", range(3))
+    def test_auto_rpq(self, seed):
+        graph = self.random_graph(40, 120, seed)
+        for regex in ["a b", "(a|b)* c"]:
+            for starts in [{1}, {0, 3, 5}, None]:
+                finals = None if starts is None else set(graph.nodes)
+                expected = rpq(Regex(regex), graph, starts, finals, alg_type="tensor")
+                for threshold in [0.0, 0.05, 1.0]:
+                    actual = rpq(
+                        Regex(regex),
+                        graph,
+                        starts,
+                        finals,
+                        frontier_threshold=threshold,
+                    )
+                    assert actual == expected
+
+    @pytest.mark.parametrize(
+        "workers, executor", [(None, "process"), (2, "thread"), (3, "process")]
+    )
+    def test_rpq_batch(self, workers, executor):
+        graph = self.random_graph(20, 60, 1)
+        regexes = ["a b", "(a|b)* c", "a* b*", "c (a b)*", Regex("b c")]
+        for starts, finals in [(None, None), ({0, 3, 5, 7}, {1, 2, 3, 8, 11})]:
+            expected = [rpq(regex, graph, starts, finals) for regex in regexes]
+            for alg_type in ["tensor", "frontier"]:
+                actual = rpq_batch(
+                    regexes,
+                    graph,
+                    starts,
+                    finals,
+                    alg_type=alg_type,
+                    workers=workers,
+                    executor=executor,
+                )
+                assert actual == expected
+        assert rpq_batch([], graph) == []
+
+    @pytest.mark.parametrize("batch_size", [1, 3, None])
+    def test_rpq_iter(self, batch_size):
+        graph = self.random_graph(20, 60, 2)
+        for regex in ["a b", "(a|b)* c", "a* b*"]:
+            expected = rpq(regex, graph)
+            pairs = list(rpq_iter(regex, graph, batch_size=batch_size))
+            assert len(pairs) == len(set(pairs))
+            assert set(pairs) == expected
+
+            limited = list(rpq_iter(regex, graph, batch_size=batch_size, limit=5))
+            assert len(limited) == min(5, len(expected))
+            assert set(limited) <= expected
+
+            found = list(rpq_iter(regex, graph, exists=True))
+            assert len(found) == (1 if expected else 0)
+            assert set(found) <= expected
+
+        assert list(rpq_iter("a", graph, set(), set())) == []
+        for automaton in ["dfa", "glushkov"]:
+            pairs = rpq_iter("(a|b)* c", graph, automaton=automaton)
+            assert set(pairs) == rpq("(a|b)* c", graph)
+
+    @pytest.mark.parametrize("seed", range(3))
+    @pytest.mark.parametrize("regex", ["a b", "(a|b)* c", "a* b*", "c (a b)*"])
+    def test_backward_rpq(self, seed, regex):
+        graph = self.random_graph(30, 80, seed)
+        nodes = set(graph.nodes)
+        for starts, finals in [
+            (None, None),
+            (nodes, {1, 2}),
+            ({0, 4, 5, 6}, {1, 2, 8, 9}),
+        ]:
+            expected = rpq(regex, graph, starts, finals, alg_type="tensor")
+            for alg_type in ["backward", "bidirectional", "auto"]:
+                assert rpq(regex, graph, starts, finals, alg_type=alg_type) == expected
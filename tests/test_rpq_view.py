@@ -0,0 +1,63 @@
+import random
+
+import pytest
+from networkx import MultiDiGraph
+from project.rpq import rpq
+from project.rpq_view import RpqView
+
+
+class TestsForRpqView:
+    @staticmethod
+    def random_edges(nodes, edges, rng):
+        return [
+            (rng.randrange(nodes), rng.randrange(nodes), rng.choice("abc"))
+            for _ in range(edges)
+        ]
+
+    @staticmethod
+    def expected(regex, edges, start_nodes, final_nodes):
+        graph = MultiDiGraph()
+        graph.add_edges_from((u, v, {"label": label}) for u, v, label in edges)
+        return rpq(regex, graph, start_nodes, final_nodes, alg_type="tensor")
+
+    @pytest.mark.parametrize("seed", range(2))
+    @pytest.mark.parametrize("regex", ["a b", "(a|b)* c", "a* b*"])
+    @pytest.mark.parametrize("recompute_share", [0.0, 1.0])
+    def test_updates(self, seed, regex, recompute_share):
+        rng = random.Random(seed)
+        edges = self.random_edges(8, 12, rng)
+        start_nodes, final_nodes = (
+            ({0, 1, 2, 9}, {3, 4, 5, 9}) if seed else (None, None)
+        )
+        graph = MultiDiGraph()
+        graph.add_edges_from((u, v, {"label": label}) for u, v, label in edges)
+        view = RpqView(
+            regex, graph, start_nodes, final_nodes, recompute_share=recompute_share
+        )
+        assert view.result() == self.expected(regex, edges, start_nodes, final_nodes)
+
+        for _ in range(6):
+            inserted = self.random_edges(10, 3, rng)
+            view.insert(inserted)
+            edges += inserted
+            assert view.result() == self.expected(
+                regex, edges, start_nodes, final_nodes
+            )
+
+            deleted = rng.sample(edges, 3)
+            view.delete(deleted)
+            for edge in deleted:
+                edges.remove(edge)
+            assert view.result() == self.expected(
+                regex, edges, start_nodes, final_nodes
+            )
+
+    def test_empty_view(self):
+        view = RpqView("a b")
+        assert view.result() == set()
+        view.insert([(0, 1, "a"), (1, 2, "b")])
+        assert view.result() == {(0, 2)}
+        view.delete([(1, 2, "b")])
+        assert view.result() == set()
+        with pytest.raises(ValueError):
+            view.delete([(1, 2, "b")])